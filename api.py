@@ -1,136 +1,550 @@
 # api.py
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict
-
-from utils.NewsScrapper import get_news_articles
-from utils.Summarizer import get_summary
-from utils.SentimentAnalysis import get_sentiment
-from utils.ComparitiveAnalysis import generate_structured_analysis, generate_sentiment_summary, topic_overlap, generate_coverage_comparisons, sentiment_distribution
-from utils.TTSHindi import speak_hindi_sentiment_report
-
-app = FastAPI()
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Literal, Optional
+
+from utils import Config
+from utils.Summarizer import get_summaries
+from utils.SentimentAnalysis import MAX_STRIDE, get_sentiments
+from utils.ComparitiveAnalysis import encode_texts, generate_batch_analysis, generate_structured_analysis, generate_sentiment_summary, generate_comparative_sentiment_score, sentiment_distribution
+from utils.TTSHindi import (
+    audio_report_etag, audio_report_id, parse_audio_report_id, render_audio_report, speak_hindi_sentiment_report,
+    warm_phrase_cache
+)
+from utils.Cache import cache
+from utils.HttpClient import AsyncHttpClient
+from utils.Executors import ExecutorSaturated, map_in_executor, run_in_executor, shutdown_executors
+from utils.Jobs import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, jobs
+from utils.Log import configure_logging
+from utils.Metrics import REQUEST_SECONDS, metrics_payload, request_timings
+from utils.Models import readiness, start_background_warm_up
+from utils.Responses import CompressionMiddleware, FastJSONResponse, json_dumps, parse_range
+from utils.VectorStore import vector_store
+from utils.NewsIndex import (
+    news_index, get_indexed_articles_async, get_indexed_articles_batch_async, refresh_company_async, run_refresher,
+    stream_indexed_articles_async
+)
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # One pooled async HTTP client shared by every request
+    app.state.http_client = AsyncHttpClient()
+    # Workers that run /analyze jobs
+    jobs.start()
+    # Models load lazily; warming them in the background lets the server answer immediately
+    if Config.WARMUP_MODELS:
+        start_background_warm_up()
+        threading.Thread(target=warm_phrase_cache, name="tts-warmup", daemon=True).start()
+    # Watched companies are kept fresh in the news index in the background
+    refresher = None
+    if news_index.enabled:
+        for company in Config.WATCHED_COMPANIES:
+            news_index.watch(company)
+        refresher = asyncio.create_task(run_refresher(app.state.http_client))
+    yield
+    if refresher is not None:
+        refresher.cancel()
+    await jobs.stop()
+    await app.state.http_client.aclose()
+    shutdown_executors()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# Reports are large and repetitive JSON; audio and event streams are left uncompressed
+app.add_middleware(CompressionMiddleware)
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (e.g. /watchlist/{company_name}) to keep the label set bounded
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        route.path if route is not None else "unmatched", request.method, response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
+
+
+def busy(e):
+    """
+    Backpressure response for when a model executor is saturated.
+    """
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "2"})
+
+
+def require_index():
+    if not news_index.enabled:
+        raise HTTPException(status_code=503, detail="The news index is disabled")
 
 # ------------------ MODELS ------------------ #
 
 class CompanyRequest(BaseModel):
     company_name: str
+    top_k: Optional[int] = Field(None, ge=1)  # report only the k most and k least similar article pairs
+    include_timings: bool = False  # add a per-stage timing breakdown to the response
+
+class AnalyzeRequest(CompanyRequest):
+    wait: bool = False  # answer with the finished report instead of a job id
+
+class BatchCompanyRequest(BaseModel):
+    company_names: List[str]
+    top_k: Optional[int] = Field(None, ge=1)
+    include_audio: bool = False  # also embed each company's Hindi audio report as base64
+    include_timings: bool = False
 
 class TextListRequest(BaseModel):
     texts: List[str]
 
+class SentimentRequest(TextListRequest):
+    long_document: bool = False  # score every token window of each text instead of truncating
+    stride: int = Field(0, ge=0, le=MAX_STRIDE)  # tokens shared by consecutive windows
+    aggregation: Literal["weighted", "max"] = "weighted"  # SentimentAnalysis.AGGREGATIONS
+
 class ArticlesRequest(BaseModel):
     articles: List[Dict]  # expecting articles with at least "title" and "summary" fields
+    top_k: Optional[int] = Field(None, ge=1)  # report only the k most and k least similar article pairs
+
+class SimilarRequest(BaseModel):
+    # Either free text or the URL of an indexed article
+    text: Optional[str] = None
+    url: Optional[str] = None
+    company: Optional[str] = None  # only search this company's articles
+    k: int = Field(10, ge=1, le=50)
 
 
 # ------------------ ROUTES ------------------ #
 
 @app.get("/test")
-def test():
+async def test():
     return {"message": "Testing news Sentiment Analysis API is up and running."}
 
 
+@app.get("/health")
+async def health():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    # Readiness: every model is loaded, so requests won't pay for a cold start
+    status = readiness()
+    return FastJSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+
+@app.get("/index/stats")
+async def index_stats():
+    require_index()
+    return {**news_index.stats(), "vectors": vector_store.stats()}
+
+
+@app.post("/similar")
+async def similar_articles(request: SimilarRequest):
+    """
+    Stored articles, from any company and any past report, whose summaries are closest to a piece of
+    text or to an indexed article.
+    """
+    if not vector_store.enabled:
+        raise HTTPException(status_code=503, detail="The vector store is disabled")
+    if not request.text and not request.url:
+        raise HTTPException(status_code=422, detail="Provide either text or url")
+    try:
+        started = time.perf_counter()
+        if request.url:
+            query = await run_in_executor("io", vector_store.vector_for_url, request.url)
+            if query is None:
+                raise HTTPException(status_code=404, detail=f"{request.url} is not indexed")
+        else:
+            query = (await run_in_executor("embedding", encode_texts, [request.text]))[0]
+        results, searched = await run_in_executor(
+            "io", vector_store.search, query, request.k, company=request.company, exclude_url=request.url
+        )
+        return {
+            "results": results,
+            "searched": searched,
+            "took_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    except HTTPException:
+        raise
+    except ExecutorSaturated as e:
+        raise busy(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/watchlist")
+async def get_watchlist():
+    require_index()
+    return {"companies": news_index.watched()}
+
+
+@app.post("/watchlist")
+async def watch_company(request: CompanyRequest, background_tasks: BackgroundTasks):
+    require_index()
+    news_index.watch(request.company_name)
+    # Index the company right away rather than on the next refresher pass
+    background_tasks.add_task(refresh_company_async, request.company_name, app.state.http_client)
+    return {"companies": news_index.watched()}
+
+
+@app.delete("/watchlist/{company_name}")
+async def unwatch_company(company_name: str):
+    require_index()
+    if not news_index.unwatch(company_name):
+        raise HTTPException(status_code=404, detail=f"{company_name} is not on the watchlist")
+    return {"companies": news_index.watched()}
+
+
 @app.get("/")
-def home(company_name: str = None):
+async def home(company_name: str = None):
     if company_name:
         return {"message": f"Company Name: {company_name}"}
     return {"message": "News Sentiment Analysis API is up and running."}
 
 @app.post("/news")
-def fetch_news(request: CompanyRequest):
+async def fetch_news(request: CompanyRequest):
     try:
-        articles = get_news_articles(request.company_name, limit=10)
-        return {"articles": articles}
+        articles = await get_indexed_articles_async(
+            request.company_name, app.state.http_client, limit=Config.REPORT_ARTICLES,
+            with_embeddings=False, with_text=True
+        )
+        return {"articles": [article.to_dict() for article in articles]}
+    except ExecutorSaturated as e:
+        raise busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/summary")
-def summarize_articles(request: TextListRequest):
+async def summarize_articles(request: TextListRequest):
     try:
-        summarized = []
-        for text in request.texts:
-            summary = get_summary(text)
-            summarized.append({"summary": summary})
-        return {"summaries": summarized}
+        summaries = await map_in_executor("summary", get_summaries, request.texts, Config.SUMMARY_WORKERS)
+        return {"summaries": [{"summary": summary} for summary in summaries]}
+    except ExecutorSaturated as e:
+        raise busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/sentiment")
-def analyze_sentiments(request: TextListRequest):
+async def analyze_sentiments(request: SentimentRequest):
     try:
-        sentiments = []
-        for text in request.texts:
-            result = get_sentiment(text)
-            sentiments.append(result)
+        sentiments = await run_in_executor(
+            "sentiment",
+            get_sentiments,
+            request.texts,
+            long_document=request.long_document,
+            stride=request.stride,
+            aggregation=request.aggregation
+        )
         return {"sentiments": sentiments}
+    except ExecutorSaturated as e:
+        raise busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/compare")
-def compare_articles(request: ArticlesRequest):
+async def compare_articles(request: ArticlesRequest):
     try:
         articles = request.articles
 
-        # Enrich articles with topics if not already added
-        for a in articles:
-            if 'topics' not in a:
-                a['topics'] = []
-
-        sentiment_dist, avg_score = sentiment_distribution(articles)
-        coverage_differences = generate_coverage_comparisons(articles)
-        topics = topic_overlap(articles)
+        # Topics come from clustering the summary embeddings, which also feed the coverage comparisons
+        comparative_score = await run_in_executor(
+            "embedding", generate_comparative_sentiment_score, articles, top_k=request.top_k
+        )
         summary = generate_sentiment_summary(articles)
 
-        return {
-            "Sentiment Distribution": dict(sentiment_dist),
-            "Coverage Differences": coverage_differences,
-            "Topic Overlap": topics,
+        return FastJSONResponse({
+            **comparative_score,
             "Summary": summary
-        }
+        })
 
+    except ExecutorSaturated as e:
+        raise busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/tts")
-def generate_tts(request: ArticlesRequest):
+async def generate_tts(request: ArticlesRequest):
     try:
         sentiment_dist, _ = sentiment_distribution(request.articles)
         final_summary = generate_sentiment_summary(request.articles)
 
-        base64_audio = speak_hindi_sentiment_report(sentiment_dist, final_summary)
+        base64_audio = await run_in_executor("io", speak_hindi_sentiment_report, sentiment_dist, final_summary)
 
         if not base64_audio:
             raise HTTPException(status_code=500, detail="TTS generation failed")
 
-        return {"audio_base64": base64_audio}
+        return {"audio_base64": base64_audio, "audio_url": audio_url(sentiment_dist, final_summary)}
 
+    except ExecutorSaturated as e:
+        raise busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/analyze")
-def full_pipeline_analysis(request: CompanyRequest):
+def audio_url(sentiment_dist, final_summary):
+    # /audio only serves distributions a company report can produce
+    if sum(sentiment_dist.values()) > Config.REPORT_ARTICLES:
+        return None
+    return f"/audio/{audio_report_id(sentiment_dist, final_summary)}"
+
+
+def report_audio_url(report):
+    """
+    Where a report's Hindi audio is served; clients fetch it separately from GET /audio/{audio_id}.
+    """
+    return audio_url(report["Comparative Sentiment Score"]["Sentiment Distribution"], report["Final Sentiment Analysis"])
+
+
+@app.api_route("/audio/{audio_id}", methods=["GET", "HEAD"])
+async def get_audio(audio_id: str, request: Request):
+    """
+    The Hindi audio report named by a report's `audio_url`, as audio/mpeg. The ETag changes only with the
+    report's sentiment counts and summary, so clients revalidate with If-None-Match; a single byte Range
+    is answered with 206 so players can seek.
+    """
     try:
-        # Step 1: News Extraction
-        articles = get_news_articles(request.company_name, limit=10)
+        parse_audio_report_id(audio_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    etag = audio_report_etag(audio_id)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={Config.AUDIO_MAX_AGE_SECONDS}"
+    }
+    # Revalidations are answered without rendering the audio
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
 
-        # Step 2: Full Comparative Analysis
-        report = generate_structured_analysis(request.company_name, articles)
+    try:
+        audio = await run_in_executor("io", render_audio_report, audio_id)
+    except ExecutorSaturated as e:
+        raise busy(e)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"TTS generation failed: {e}", headers={"Retry-After": "10"})
 
-        # Step 3: Generate Hindi TTS
-        sentiment_dist = report["Comparative Sentiment Score"]["Sentiment Distribution"]
-        final_summary = report["Final Sentiment Analysis"]
-        audio_filename = "hindisentimentreport.mp3"
-        speak_hindi_sentiment_report(sentiment_dist, final_summary, filename=audio_filename)
+    # A Range conditioned on another version of the audio gets the whole body
+    range_header = request.headers.get("range")
+    if request.headers.get("if-range", etag) != etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, len(audio))
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(audio)}"})
+    if byte_range is None:
+        return Response(content=audio, media_type="audio/mpeg", headers=headers)
+    start, end = byte_range
+    return Response(
+        content=audio[start:end + 1], status_code=206, media_type="audio/mpeg",
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{len(audio)}"}
+    )
+
+
+async def run_analysis(job, company_name, top_k):
+    """
+    The /analyze pipeline, run as a job so identical concurrent requests share one run.
+    """
+    # Step 1: News Extraction, served from the news index (only new feed items are processed)
+    job.update(stage="fetching articles")
+    articles = await get_indexed_articles_async(company_name, app.state.http_client, limit=Config.REPORT_ARTICLES)
+
+    # Step 2: Full Comparative Analysis
+    job.update(stage="analyzing", articles=len(articles))
+    report = await run_in_executor("embedding", generate_structured_analysis, company_name, articles, top_k=top_k)
+
+    # Step 3: Hindi TTS is rendered when the client fetches the audio
+    report["audio_url"] = report_audio_url(report)
+    job.update(stage="done")
+    return report
+
+
+def job_response(job, include_timings=False):
+    state = job.describe()
+    if include_timings and job.timings is not None:
+        state["timings"] = job.timings
+    return state
 
-        report["Audio"] = audio_filename
 
-        return report
+@app.post("/analyze")
+async def full_pipeline_analysis(request: AnalyzeRequest):
+    """
+    Queue the full pipeline for a company and return its job ({"job_id", "status", ...}, 202), to be
+    polled at /jobs/{job_id}. Requests for a company already being analyzed join that job, and a report
+    finished within NEWS_JOB_RESULT_TTL_SECONDS is reused. With "wait": true the report itself is returned.
+    """
+    key = ("analyze", news_index.company_key(request.company_name), request.top_k)
+    priority = PRIORITY_INTERACTIVE if request.wait else PRIORITY_BACKGROUND
+    try:
+        job, _ = jobs.submit(
+            key, lambda job: run_analysis(job, request.company_name, request.top_k), priority=priority
+        )
+    except ExecutorSaturated as e:
+        raise busy(e)
+
+    if not request.wait:
+        return FastJSONResponse(status_code=202 if job.active else 200, content=job_response(job))
+
+    await job.wait()
+    if job.status == "failed":
+        raise HTTPException(
+            status_code=job.error["status_code"], detail=job.error["detail"],
+            headers={"Retry-After": "2"} if job.error["status_code"] == 429 else None
+        )
+    report = dict(job.result)
+    if request.include_timings:
+        report["timings"] = job.timings
+    return FastJSONResponse(report)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, include_timings: bool = False):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job {job_id}")
+    return FastJSONResponse(job_response(job, include_timings))
+
+
+@app.get("/jobs")
+async def job_stats():
+    return jobs.stats()
+
+
+@app.post("/analyze/batch")
+async def batch_pipeline_analysis(request: BatchCompanyRequest):
+    """
+    /analyze for many companies in one call. Feeds are fetched concurrently and every company's articles
+    share the same batched summary, sentiment and embedding passes. Returns {"reports": {company: report}},
+    plus {"errors": {company: detail}} for companies whose feed could not be fetched; those are reported
+    from their already indexed articles when there are any.
+    """
+    company_names = list(dict.fromkeys(name.strip() for name in request.company_names if name.strip()))
+    if not company_names:
+        raise HTTPException(status_code=422, detail="company_names must contain at least one company")
+    if len(company_names) > Config.BATCH_MAX_COMPANIES:
+        raise HTTPException(
+            status_code=422, detail=f"At most {Config.BATCH_MAX_COMPANIES} companies can be analyzed per request"
+        )
 
+    try:
+        with request_timings() as timings:
+            errors = {}
+            articles_by_company = await get_indexed_articles_batch_async(
+                company_names, app.state.http_client, limit=Config.REPORT_ARTICLES, errors=errors
+            )
+            # A company whose feed failed is reported from its indexed articles, if it has any
+            articles_by_company = {
+                company: articles for company, articles in articles_by_company.items()
+                if articles or company not in errors
+            }
+            reports = await run_in_executor(
+                "embedding", generate_batch_analysis, articles_by_company, top_k=request.top_k
+            )
+            for report in reports.values():
+                report["audio_url"] = report_audio_url(report)
+
+            if request.include_audio:
+                # At most one TTS call per io worker, so a large batch does not overflow the io queue
+                slots = asyncio.Semaphore(Config.IO_WORKERS)
+
+                async def speak(report):
+                    async with slots:
+                        return await run_in_executor(
+                            "io",
+                            speak_hindi_sentiment_report,
+                            report["Comparative Sentiment Score"]["Sentiment Distribution"],
+                            report["Final Sentiment Analysis"]
+                        )
+
+                audio = await asyncio.gather(*(speak(report) for report in reports.values()))
+                for report, audio_base64 in zip(reports.values(), audio):
+                    report["audio_base64"] = audio_base64
+
+        response = {"reports": reports}
+        if errors:
+            response["errors"] = {company: str(error) for company, error in errors.items()}
+        if request.include_timings:
+            response["timings"] = timings
+        return FastJSONResponse(response)
+
+    except ExecutorSaturated as e:
+        raise busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json_dumps(data)}\n\n"
+
+
+@app.post("/analyze/stream")
+async def stream_pipeline_analysis(request: CompanyRequest):
+    """
+    Server-Sent Events variant of /analyze: an `article` event per article as soon as its summary and
+    sentiment are ready, then `analysis` with the comparative report (which carries each article's topic
+    cluster), then `done` (carrying the timing
+    breakdown when include_timings is set). The report's `audio_url` can be fetched as soon as it arrives.
+    """
+    async def events():
+        try:
+            with request_timings() as timings:
+                articles = []
+                async for article in stream_indexed_articles_async(
+                    request.company_name, app.state.http_client, limit=Config.REPORT_ARTICLES
+                ):
+                    articles.append(article)
+                    yield sse_event("article", {
+                        "Index": len(articles),
+                        "Title": article.title,
+                        "Summary": article.summary,
+                        "Sentiment": article.sentiment,
+                        "Syndication Count": article.syndication_count
+                    })
+
+                report = await run_in_executor(
+                    "embedding", generate_structured_analysis, request.company_name, articles, top_k=request.top_k
+                )
+                report["audio_url"] = report_audio_url(report)
+                yield sse_event("analysis", report)
+
+            yield sse_event("done", {"timings": timings} if request.include_timings else {})
+
+        except ExecutorSaturated as e:
+            yield sse_event("error", {"status_code": 429, "detail": str(e)})
+        except Exception as e:
+            yield sse_event("error", {"status_code": 500, "detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
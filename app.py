@@ -2,12 +2,39 @@
 
 import streamlit as st
 import requests
-import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 API_BASE_URL = "http://127.0.0.1:8000" 
 #API_BASE_URL = "https://karenrena-newslytics-api.hf.space"  # Update to your deployed backend URL on Hugging Face Spaces
 
 
+def fetch_audio(audio_url):
+    """
+    Download the Hindi audio report (MP3 bytes), or None if the backend could not produce it.
+    """
+    response = requests.get(f"{API_BASE_URL}{audio_url}", timeout=60)
+    return response.content if response.status_code == 200 else None
+
+
+def iter_sse_events(response):
+    """
+    Parse a Server-Sent Events response into (event, data) pairs.
+    """
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
 st.set_page_config(page_title="📰 News Sentiment Analyzer", layout="centered")
 st.title("📰 Company News Analyzer with Hindi Audio Report")
 
@@ -22,38 +49,61 @@ if st.button("Run Analysis"):
     if not company.strip():
         st.warning("Please enter a valid company name.")
     else:
-        st.info("Running full pipeline via `/analyze` API...")
+        st.info("Running full pipeline via `/analyze/stream` API...")
 
         try:
-            response = requests.post(f"{API_BASE_URL}/analyze", json={"company_name": company})
+            response = requests.post(f"{API_BASE_URL}/analyze/stream", json={"company_name": company}, stream=True)
             
             if response.status_code == 200:
-                data = response.json()
-
-                st.subheader(f"📌 Company: {data.get('Company', '')}")
-
-                for i, article in enumerate(data.get("Articles", []), 1):
-                    st.markdown(f"### Article {i}")
-                    st.markdown(f"**Title:** {article.get('Title', '')}")
-                    st.markdown(f"**Summary:** {article.get('Summary', '')}")
-                    st.markdown(f"**Sentiment:** {article.get('Sentiment', '')}")
-                    st.markdown(f"**Topics:** {', '.join(article.get('Topics', []))}")
-
-                st.subheader("📊 Comparative Sentiment Score")
-                st.json(data.get("Comparative Sentiment Score", {}))
-
-                st.subheader("🧠 Final Sentiment Summary")
-                st.write(data.get("Final Sentiment Analysis", ""))
-
-                st.subheader("🎧 Hindi Audio Report")
-                audio_base64 = data.get("audio_base64", "")
-
-                if audio_base64:
-                    audio_bytes = base64.b64decode(audio_base64)
-                    st.audio(audio_bytes, format="audio/mp3")
-                    st.download_button("⬇ Download Hindi Audio", audio_bytes, file_name="hindisentimentreport.mp3", mime="audio/mp3")
-                else:
-                    st.warning("No audio received from backend.")
+                st.subheader(f"📌 Company: {company}")
+                status = st.empty()
+                status.caption("Fetching articles...")
+                # The audio is downloaded in the background while the report is rendered
+                downloads = ThreadPoolExecutor(max_workers=1)
+                audio = None
+
+                for event, data in iter_sse_events(response):
+                    if event == "article":
+                        # Articles are rendered as soon as the backend has processed each one
+                        st.markdown(f"### Article {data.get('Index', '')}")
+                        st.markdown(f"**Title:** {data.get('Title', '')}")
+                        st.markdown(f"**Summary:** {data.get('Summary', '')}")
+                        st.markdown(f"**Sentiment:** {data.get('Sentiment', '')}")
+                        status.caption("Processing more articles...")
+
+                    elif event == "analysis":
+                        if data.get("audio_url"):
+                            audio = downloads.submit(fetch_audio, data["audio_url"])
+                        # Topics are clustered over all the articles, so they arrive with the analysis
+                        st.subheader("🏷️ Topics")
+                        for i, article in enumerate(data.get("Articles", []), 1):
+                            st.markdown(f"**Article {i}:** {', '.join(article.get('Topics', []))}")
+
+                        st.subheader("📊 Comparative Sentiment Score")
+                        st.json(data.get("Comparative Sentiment Score", {}))
+
+                        st.subheader("🧠 Final Sentiment Summary")
+                        st.write(data.get("Final Sentiment Analysis", ""))
+
+                    elif event == "error":
+                        st.error(f"Error from API: {data.get('detail', 'Unknown error')}")
+
+                if audio is not None:
+                    status.caption("Loading Hindi audio report...")
+                    st.subheader("🎧 Hindi Audio Report")
+                    try:
+                        audio_bytes = audio.result()
+                    except requests.RequestException:
+                        audio_bytes = None
+
+                    if audio_bytes:
+                        st.audio(audio_bytes, format="audio/mp3")
+                        st.download_button("⬇ Download Hindi Audio", audio_bytes, file_name="hindisentimentreport.mp3", mime="audio/mp3")
+                    else:
+                        st.warning("No audio received from backend.")
+                downloads.shutdown(wait=False)
+
+                status.empty()
 
             else:
                 st.error(f"Error from API: {response.json().get('detail', 'Unknown error')}")
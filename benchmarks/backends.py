@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from html import unescape
+from multiprocessing import get_context
+
+import numpy as np
+
+'''
+Compares the CPU inference backends (torch fp32, torch-int8, onnx) of the sentiment and embedding
+models on a fixed sample: latency, peak RSS, and agreement with the fp32 labels, scores and embeddings.
+Each backend runs in its own process so memory numbers are not mixed up. Needs the real models. Usage:
+
+    python -m benchmarks.backends --backends torch torch-int8 onnx --repeat 5
+'''
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ARTICLES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "articles")
+
+# Fixed headlines covering clearly positive, negative and neutral wording
+HEADLINES = [
+    "Acme Corp beats estimates as cloud revenue soars to a record",
+    "Acme Corp shares plunge after guidance cut and CEO departure",
+    "Acme Corp to hold annual shareholder meeting on June 12",
+    "Regulators fine Acme Corp over misleading advertising claims",
+    "Acme Corp wins multi-year contract with national rail operator",
+    "Acme Corp recalls 40,000 devices over battery overheating risk",
+    "Acme Corp names new chief financial officer",
+    "Analysts upgrade Acme Corp on strong subscription growth",
+    "Acme Corp faces class action lawsuit from former employees",
+    "Acme Corp opens new research centre in Bengaluru",
+    "Acme Corp misses revenue forecast as demand weakens",
+    "Acme Corp completes acquisition of robotics start-up",
+    "Acme Corp says outage affected some customers on Tuesday",
+    "Acme Corp dividend raised for the tenth consecutive year",
+    "Acme Corp under investigation for alleged accounting irregularities",
+    "Acme Corp publishes its annual sustainability report",
+]
+
+
+def load_sample():
+    """
+    Headlines, the fixture feed's titles and descriptions, and the full fixture article bodies.
+    """
+    from benchmarks.fixture_server import load_feed_items
+
+    texts = list(HEADLINES)
+    for item in load_feed_items():
+        texts.append(unescape(item['title']))
+        texts.append(unescape(item['description']))
+    for name in sorted(os.listdir(ARTICLES_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(ARTICLES_DIR, name), encoding="utf-8") as f:
+                texts.append(f.read().strip())
+    return texts
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def timed_runs(fn, repeat):
+    fn()  # warm-up, e.g. ONNX Runtime's first-run allocations
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return result, durations
+
+
+def measure_backend(backend, texts, repeat):
+    """
+    Runs in a fresh process: load both models on `backend` and time them over the sample.
+    """
+    from utils.Cache import cache
+    from utils import ComparitiveAnalysis, SentimentAnalysis
+
+    cache.enabled = False
+    result = {"backend": backend, "baseline_rss_mb": peak_rss_mb()}
+
+    started = time.perf_counter()
+    SentimentAnalysis._sentiment_model.set(SentimentAnalysis._load_sentiment_model(backend))
+    result["sentiment_load_s"] = round(time.perf_counter() - started, 3)
+    predictions, durations = timed_runs(lambda: SentimentAnalysis._predict(
+        texts, SentimentAnalysis.BATCH_SIZE, True, 0, "weighted", SentimentAnalysis.MAX_WINDOWS_PER_TEXT
+    ), repeat)
+    result["sentiment_rss_mb"] = peak_rss_mb()
+    result["sentiment_ms"] = round(min(durations) * 1000, 2)
+    result["labels"] = [p["sentiment"] for p in predictions]
+    result["scores"] = [p["score"] for p in predictions]
+
+    started = time.perf_counter()
+    model = ComparitiveAnalysis._load_embedding_model(backend)
+    result["embedding_load_s"] = round(time.perf_counter() - started, 3)
+    embeddings, durations = timed_runs(lambda: np.asarray(model.encode(texts), dtype=np.float32), repeat)
+    result["embedding_rss_mb"] = peak_rss_mb()
+    result["embedding_ms"] = round(min(durations) * 1000, 2)
+    result["embeddings"] = embeddings.tolist()
+    return result
+
+
+def agreement(baseline, result):
+    """
+    Agreement of a backend with the fp32 baseline on the same sample.
+    """
+    score_diff = np.abs(np.array(result["scores"]) - np.array(baseline["scores"]))
+    a, b = np.array(result["embeddings"]), np.array(baseline["embeddings"])
+    cosine = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return {
+        "label_agreement": round(float(np.mean([x == y for x, y in zip(result["labels"], baseline["labels"])])), 4),
+        "score_mean_abs_diff": round(float(score_diff.mean()), 4),
+        "score_max_abs_diff": round(float(score_diff.max()), 4),
+        "embedding_cosine_mean": round(float(cosine.mean()), 5),
+        "embedding_cosine_min": round(float(cosine.min()), 5)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare CPU inference backends against fp32.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="path of the JSON result file")
+    args = parser.parse_args(argv)
+
+    from utils.InferenceBackend import inference_threads
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    texts = load_sample()
+    runs = {}
+    for backend in backends:
+        print(f"[INFO] Measuring backend '{backend}' on {len(texts)} texts...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            try:
+                runs[backend] = pool.submit(measure_backend, backend, texts, args.repeat).result()
+            except Exception as e:
+                print(f"[WARN] Backend '{backend}' failed: {e}")
+
+    if "torch" not in runs:
+        print("[ERROR] The fp32 baseline could not be measured.")
+        return None
+
+    baseline = runs["torch"]
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"repeat": args.repeat, "threads": inference_threads(), "sample_size": len(texts)},
+        "backends": {}
+    }
+    for backend, run in runs.items():
+        summary = {key: value for key, value in run.items() if key not in ("labels", "scores", "embeddings")}
+        summary.update(agreement(baseline, run))
+        results["backends"][backend] = summary
+        print(f"[INFO] {backend}: sentiment {summary['sentiment_ms']} ms, embedding {summary['embedding_ms']} ms, "
+              f"peak RSS {summary['embedding_rss_mb']} MB, label agreement {summary['label_agreement']}, "
+              f"embedding cosine {summary['embedding_cosine_mean']}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"backends-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[SUCCESS] Backend results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
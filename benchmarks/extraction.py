@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from multiprocessing import get_context
+
+from utils.ArticleExtractor import ArticleExtractor
+from utils.NewsScrapper import parse_article_html
+
+'''
+Compares article text extraction engines on the saved HTML corpus in fixtures/articles:
+the BeautifulSoup <p> join (parse_article_html) against the streaming lxml ArticleExtractor.
+Reports speed, peak memory, and token precision / recall / F1 against the gold article bodies stored
+next to each page as <name>.txt. Each engine runs in its own process; peak memory is reported both as
+the growth of the process's peak RSS, which includes libxml2's C allocations, and as the peak of
+Python allocations traced by tracemalloc.
+The gold bodies do not come from either engine: they are the paragraphs of each page's article
+container, picked by hand in GOLD_CONTAINERS and read with the standard library's HTML parser
+(--write-gold regenerates them). Usage:
+
+    python -m benchmarks.extraction --repeat 50 --inflate 20
+'''
+
+ARTICLES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "articles")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+CHUNK_SIZE = 16 * 1024
+
+_WORD = re.compile(r"\w+")
+
+# Element holding each page's article body, as (tag, attribute, value). The gold text is the
+# paragraphs directly inside it that have no class (bylines, promos and the like are classed or nested).
+GOLD_CONTAINERS = {
+    "chip.html": ("section", "class", "article"),
+    "earnings.html": ("div", "class", "story-body"),
+    "inquiry.html": ("div", "class", "article-content"),
+    "layoffs.html": ("div", "id", "article-body")
+}
+
+
+class _GoldParser(HTMLParser):
+    VOID = {"br", "img", "hr", "meta", "link", "input", "source", "wbr"}
+
+    def __init__(self, container):
+        super().__init__()
+        self.container = container
+        self.depth = 0
+        self.container_depth = None
+        self.paragraph = None
+        self.paragraphs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID:
+            return
+        self.depth += 1
+        name, attribute, value = self.container
+        attrs = dict(attrs)
+        if self.container_depth is None and tag == name and value in (attrs.get(attribute) or "").split():
+            self.container_depth = self.depth
+        elif tag == "p" and self.depth == (self.container_depth or -1) + 1 and "class" not in attrs:
+            self.paragraph = []
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID:
+            return
+        if tag == "p" and self.paragraph is not None:
+            self.paragraphs.append(" ".join("".join(self.paragraph).split()))
+            self.paragraph = None
+        if self.depth == self.container_depth:
+            self.container_depth = None
+        self.depth -= 1
+
+    def handle_data(self, data):
+        if self.paragraph is not None:
+            self.paragraph.append(data)
+
+
+def gold_text(html, container):
+    """
+    Text of the unclassed <p> children of `container` in a page, one paragraph per block.
+    """
+    parser = _GoldParser(container)
+    parser.feed(html)
+    parser.close()
+    return "\n\n".join(paragraph for paragraph in parser.paragraphs if paragraph)
+
+
+def write_gold():
+    for name, container in GOLD_CONTAINERS.items():
+        with open(os.path.join(ARTICLES_DIR, name), encoding="utf-8") as f:
+            text = gold_text(f.read(), container)
+        with open(os.path.join(ARTICLES_DIR, name[:-5] + ".txt"), "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[INFO] {name}: {len(text)} gold characters")
+
+
+def load_corpus(inflate=0):
+    """
+    (name, html, gold text) for every saved page. `inflate` appends that many copies of a
+    comments section before </body> to simulate heavy pages.
+    """
+    corpus = []
+    filler = "".join(
+        f'<div class="comment"><p>Reader comment {i}: I have thoughts about this, and more thoughts.</p></div>'
+        for i in range(50)
+    )
+    for name in sorted(os.listdir(ARTICLES_DIR)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(ARTICLES_DIR, name), encoding="utf-8") as f:
+            html = f.read()
+        with open(os.path.join(ARTICLES_DIR, name[:-5] + ".txt"), encoding="utf-8") as f:
+            gold = f.read()
+        if inflate:
+            html = html.replace("</body>", filler * inflate + "</body>")
+        corpus.append((name, html, gold))
+    return corpus
+
+
+def token_scores(extracted, gold):
+    """
+    Bag-of-words precision, recall and F1 of extracted text against the gold article body.
+    """
+    from collections import Counter
+
+    extracted_tokens = Counter(_WORD.findall(extracted.lower()))
+    gold_tokens = Counter(_WORD.findall(gold.lower()))
+    overlap = sum((extracted_tokens & gold_tokens).values())
+    precision = overlap / max(1, sum(extracted_tokens.values()))
+    recall = overlap / max(1, sum(gold_tokens.values()))
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def bs4_engine(html):
+    return parse_article_html(html)
+
+
+def streaming_engine(html):
+    # Feed the page in download-sized chunks, as extract_article_text does
+    extractor = ArticleExtractor()
+    for start in range(0, len(html), CHUNK_SIZE):
+        if extractor.feed(html[start:start + CHUNK_SIZE]):
+            break
+    return extractor.text
+
+
+ENGINES = {
+    "beautifulsoup": bs4_engine,
+    "lxml_streaming": streaming_engine
+}
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 if sys.platform == "darwin" else usage  # bytes on macOS, KB elsewhere
+
+
+def run_engine(name, inflate, repeat):
+    """
+    Measure one engine on the corpus. Meant to run in a fresh process, so that its peak RSS only
+    reflects this engine.
+    """
+    engine = ENGINES[name]
+    corpus = load_corpus(inflate)
+    engine(corpus[0][1])  # warm-up: imports, parser setup
+    baseline_rss = peak_rss_kb()
+    texts = [engine(html) for _, html, _ in corpus]
+    rss_growth = peak_rss_kb() - baseline_rss
+
+    pages = []
+    for (page, html, gold), text in zip(corpus, texts):
+        tracemalloc.start()
+        engine(html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            engine(html)
+        elapsed = (time.perf_counter() - started) / repeat
+
+        pages.append({
+            "page": page,
+            "html_bytes": len(html.encode("utf-8")),
+            "mean_ms": round(elapsed * 1000, 3),
+            "peak_python_kb": round(peak / 1024, 1),
+            "chars": len(text),
+            **token_scores(text, gold)
+        })
+
+    count = len(pages)
+    return {
+        "mean_ms": round(sum(p["mean_ms"] for p in pages) / count, 3),
+        "peak_rss_growth_kb": round(rss_growth, 1),
+        "peak_python_kb": max(p["peak_python_kb"] for p in pages),
+        "precision": round(sum(p["precision"] for p in pages) / count, 4),
+        "recall": round(sum(p["recall"] for p in pages) / count, 4),
+        "f1": round(sum(p["f1"] for p in pages) / count, 4),
+        "pages": pages
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark article text extraction engines.")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--inflate", type=int, default=0, help="pad each page with N blocks of comments")
+    parser.add_argument("--output", help="path of the JSON result file")
+    parser.add_argument("--write-gold", action="store_true", help="regenerate the gold .txt files and exit")
+    args = parser.parse_args(argv)
+
+    if args.write_gold:
+        write_gold()
+        return None
+
+    engines = {}
+    for name in ENGINES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            engines[name] = pool.submit(run_engine, name, args.inflate, args.repeat).result()
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"repeat": args.repeat, "inflate": args.inflate},
+        "engines": engines
+    }
+
+    for name, summary in results["engines"].items():
+        print(f"[INFO] {name}: {summary['mean_ms']} ms/page, peak RSS +{summary['peak_rss_growth_kb']} KB "
+              f"(Python {summary['peak_python_kb']} KB), F1 {summary['f1']} (P {summary['precision']}, R {summary['recall']})")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"extraction-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[SUCCESS] Extraction results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
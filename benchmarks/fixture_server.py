@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+'''
+Local stand-in for Bing News and the article sites it links to.
+The feed is built from the recorded items in fixtures/bing_rss.xml, repeated as many times as needed,
+and every link points back at this server, which answers with one of the recorded article pages.
+'''
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+ARTICLES_DIR = os.path.join(FIXTURES_DIR, "articles")
+
+ITEM_PATTERN = re.compile(r"<item>(.*?)</item>", re.S)
+FIELD_PATTERN = re.compile(r"<(title|description|pubDate)>(.*?)</\1>", re.S)
+
+
+def load_feed_items():
+    with open(os.path.join(FIXTURES_DIR, "bing_rss.xml"), encoding="utf-8") as f:
+        feed = f.read()
+    return [dict(FIELD_PATTERN.findall(item)) for item in ITEM_PATTERN.findall(feed)]
+
+
+def load_article_pages():
+    pages = []
+    for name in sorted(os.listdir(ARTICLES_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(ARTICLES_DIR, name), encoding="utf-8") as f:
+                pages.append(f.read())
+    return pages
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, feed_size=10, latency=0.0):
+        super().__init__((host, port), FixtureHandler)
+        self.feed_size = feed_size
+        self.latency = latency
+        self.items = load_feed_items()
+        self.pages = load_article_pages()
+        self.requests_served = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def render_feed(self):
+        items = []
+        for i in range(self.feed_size):
+            item = self.items[i % len(self.items)]
+            # Repeats of the recorded items get distinct titles and URLs
+            suffix = f" (part {i // len(self.items) + 1})" if i >= len(self.items) else ""
+            items.append(
+                f"<item><title>{item['title']}{escape(suffix)}</title>"
+                f"<link>{self.base_url}/articles/{i}</link>"
+                f"<description>{item['description']}</description>"
+                f"<pubDate>{item['pubDate']}</pubDate></item>"
+            )
+        return (
+            '<?xml version="1.0" encoding="utf-8" ?><rss version="2.0"><channel>'
+            "<title>Fixture - BingNews</title>" + "".join(items) + "</channel></rss>"
+        )
+
+    def render_article(self, index):
+        page = self.pages[index % len(self.pages)]
+        # Vary the text slightly so repeated pages are not byte-identical
+        return page.replace("</h1>", f" <small>#{index}</small></h1>", 1)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="fixture-server", daemon=True)
+        thread.start()
+        return self
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.requests_served += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        parsed = urlparse(self.path)
+        if parsed.path == "/news/search" and parse_qs(parsed.query).get("format") == ["rss"]:
+            self._send(server.render_feed(), "application/rss+xml; charset=utf-8")
+        elif parsed.path.startswith("/articles/"):
+            try:
+                index = int(parsed.path.split("/")[2])
+            except ValueError:
+                self.send_error(404)
+                return
+            self._send(server.render_article(index), "text/html; charset=utf-8")
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        payload = body.encode("utf-8")
+        etag = '"' + hashlib.md5(payload).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the fixture news corpus locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--feed-size", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FixtureServer(port=args.port, feed_size=args.feed_size, latency=args.latency_ms / 1000)
+    print(f"[INFO] Serving fixtures at {server.base_url} (set NEWS_BING_URL={server.base_url}/news/search)")
+    server.serve_forever()
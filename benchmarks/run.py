@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+'''
+Per-stage latency and throughput benchmark for the news pipeline, run fully offline against the
+fixture server. Usage:
+
+    python -m benchmarks.run --models stub --sizes 10 100 1000
+
+Results are written as JSON (one file per run) and appended to benchmarks/results/history.jsonl
+so runs can be compared over time.
+'''
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+COMPANY = "Acme Corp"
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def summarize_timings(durations, items):
+    """
+    Latency percentiles over the measured calls and item throughput over their total time.
+    """
+    durations = sorted(durations)
+    total = sum(durations)
+    return {
+        "calls": len(durations),
+        "items": items,
+        "total_s": round(total, 6),
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "p50_ms": round(durations[len(durations) // 2] * 1000, 3),
+        "p95_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 3),
+        "max_ms": round(durations[-1] * 1000, 3),
+        "items_per_s": round(items / total, 3) if total else None
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def run_size(size, server, args):
+    from utils import NewsScrapper, Summarizer
+    from utils.SentimentAnalysis import get_sentiments
+    from utils.ComparitiveAnalysis import generate_coverage_comparisons, sentiment_distribution, generate_sentiment_summary
+    from utils.TTSHindi import speak_hindi_sentiment_report
+
+    stages = {}
+    server.feed_size = size
+
+    # fetch_bing_news_links
+    durations = []
+    for _ in range(args.repeat):
+        articles, duration = timed(NewsScrapper.fetch_bing_news_links, COMPANY, limit=size)
+        durations.append(duration)
+    stages["fetch_bing_news_links"] = summarize_timings(durations, len(articles) * args.repeat)
+
+    # extract_article_text: per-page latency on a sample, and concurrent throughput over every page
+    sample = articles[:min(len(articles), args.latency_sample)]
+    durations = [timed(NewsScrapper.extract_article_text, a['url'])[1] for a in sample]
+    stages["extract_article_text"] = summarize_timings(durations, len(sample))
+
+    started = time.perf_counter()
+    for article, text in NewsScrapper.iter_article_texts(articles):
+        article['text'] = text
+    stages["extract_article_text_concurrent"] = summarize_timings([time.perf_counter() - started], len(articles))
+    texts = [a['text'] for a in articles]
+
+    # deduplicate_articles: URL, title and text near-duplicate collapse over the whole batch
+    _, duration = timed(NewsScrapper.deduplicate_articles, [a.copy() for a in articles])
+    stages["deduplicate_articles"] = summarize_timings([duration], len(articles))
+
+    # get_summary (one call per text) and get_summaries (batch), plus the sumy reference
+    durations = [timed(Summarizer.get_summary, text)[1] for text in texts[:args.latency_sample]]
+    stages["get_summary"] = summarize_timings(durations, len(durations))
+
+    summaries, duration = timed(Summarizer.get_summaries, texts)
+    stages["get_summaries"] = summarize_timings([duration], len(texts))
+    for article, summary in zip(articles, summaries):
+        article['summary'] = summary
+
+    if args.compare_sumy:
+        reference, duration = timed(Summarizer.get_summaries, texts, backend="sumy")
+        stages["get_summaries_sumy"] = summarize_timings([duration], len(texts))
+        stages["get_summaries_sumy"]["agreement"] = round(
+            sum(a == b for a, b in zip(summaries, reference)) / len(texts), 4
+        ) if texts else None
+
+    # get_sentiment (one call per text) and get_sentiments (batched, full-article windows)
+    durations = [timed(get_sentiments, [text], long_document=True)[1] for text in texts[:args.latency_sample]]
+    stages["get_sentiment"] = summarize_timings(durations, len(durations))
+
+    sentiments, duration = timed(get_sentiments, texts, long_document=True)
+    stages["get_sentiments"] = summarize_timings([duration], len(texts))
+    for article, sentiment in zip(articles, sentiments):
+        article['sentiment'] = sentiment['sentiment']
+        article['sentiment_score'] = sentiment['score']
+
+    # generate_coverage_comparisons: every pair, and the top-k report
+    if size <= args.max_all_pairs:
+        comparisons, duration = timed(generate_coverage_comparisons, articles)
+        stages["generate_coverage_comparisons"] = summarize_timings([duration], len(comparisons))
+    comparisons, duration = timed(generate_coverage_comparisons, articles, top_k=10)
+    stages["generate_coverage_comparisons_top10"] = summarize_timings([duration], len(articles))
+
+    # speak_hindi_sentiment_report: one report per run, repeated for a latency distribution
+    sentiment_dist, _ = sentiment_distribution(articles)
+    final_summary = generate_sentiment_summary(articles, COMPANY)
+    durations = [
+        timed(speak_hindi_sentiment_report, sentiment_dist, final_summary)[1] for _ in range(args.repeat)
+    ]
+    stages["speak_hindi_sentiment_report"] = summarize_timings(durations, len(durations))
+
+    return stages
+
+
+def run_batch(companies, args):
+    """
+    N sequential single-company analyses against one pooled batch analysis of the same N companies.
+    """
+    import asyncio
+    from utils.HttpClient import AsyncHttpClient
+    from utils.NewsScrapper import get_news_articles_async, get_news_articles_batch_async
+    from utils.ComparitiveAnalysis import generate_batch_analysis, generate_structured_analysis
+
+    names = [f"{COMPANY} {i}" for i in range(companies)]
+
+    async def sequential(client):
+        for name in names:
+            articles = await get_news_articles_async(name, client, limit=10)
+            generate_structured_analysis(name, articles, top_k=10)
+
+    async def batch(client):
+        generate_batch_analysis(await get_news_articles_batch_async(names, client, limit=10), top_k=10)
+
+    async def measure():
+        # The client is created and closed on the event loop that uses it
+        client = AsyncHttpClient()
+        try:
+            stages = {}
+            for stage, fn in (("analyze_sequential", sequential), ("analyze_batch", batch)):
+                durations = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    await fn(client)
+                    durations.append(time.perf_counter() - started)
+                stages[stage] = summarize_timings(durations, companies * args.repeat)
+            return stages
+        finally:
+            await client.aclose()
+
+    return asyncio.run(measure())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the news pipeline offline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--models", choices=["stub", "real"], default="stub",
+                        help="stub replaces the transformers and gTTS with lightweight fakes")
+    parser.add_argument("--sentiment-model", help="override the sentiment model (e.g. a tiny test model)")
+    parser.add_argument("--embedding-model", help="override the sentence transformer model")
+    parser.add_argument("--inference-backend", choices=["torch", "torch-int8", "onnx"],
+                        help="CPU inference backend for --models real")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-sample", type=int, default=20,
+                        help="number of single-item calls used for per-item latency")
+    parser.add_argument("--max-all-pairs", type=int, default=1000,
+                        help="largest size for which every article pair is compared")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated network latency per request")
+    parser.add_argument("--compare-sumy", action="store_true", help="also time sumy and report agreement")
+    parser.add_argument("--with-cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--batch-companies", type=int, default=0,
+                        help="also compare this many sequential /analyze runs against one batch analysis")
+    parser.add_argument("--output", help="path of the JSON result file")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fixture_server import FixtureServer
+
+    server = FixtureServer(latency=args.latency_ms / 1000).start()
+    os.environ["NEWS_BING_URL"] = f"{server.base_url}/news/search"
+
+    from utils import Config, NewsScrapper, SentimentAnalysis, ComparitiveAnalysis
+    from utils.Cache import cache
+
+    Config.BING_NEWS_URL = os.environ["NEWS_BING_URL"]
+    cache.enabled = args.with_cache
+    # Every fixture page lives on one local host; politeness limits would only measure the sleeps
+    NewsScrapper.PER_DOMAIN_MIN_INTERVAL = 0.0
+    NewsScrapper.PER_DOMAIN_CONCURRENCY = NewsScrapper.MAX_FETCH_WORKERS
+
+    if args.sentiment_model:
+        SentimentAnalysis.MODEL_NAME = args.sentiment_model
+    if args.embedding_model:
+        ComparitiveAnalysis.EMBEDDING_MODEL_NAME = args.embedding_model
+    if args.inference_backend:
+        Config.SENTIMENT_BACKEND = Config.EMBEDDING_BACKEND = args.inference_backend
+    if args.models == "stub":
+        from benchmarks import stubs
+        stubs.install()
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "sizes": {}
+    }
+
+    for size in args.sizes:
+        print(f"[INFO] Benchmarking {size} articles...")
+        results["sizes"][str(size)] = run_size(size, server, args)
+
+    if args.batch_companies:
+        print(f"[INFO] Benchmarking batch analysis of {args.batch_companies} companies...")
+        server.feed_size = 10
+        results["batch"] = run_batch(args.batch_companies, args)
+
+    server.shutdown()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    with open(os.path.join(RESULTS_DIR, "history.jsonl"), "a") as f:
+        f.write(json.dumps(results) + "\n")
+
+    print(f"[SUCCESS] Benchmark results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
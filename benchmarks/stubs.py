@@ -0,0 +1,52 @@
+import hashlib
+
+import numpy as np
+
+'''
+Lightweight stand-ins for the transformer models, so the pipeline can be benchmarked without
+downloading models. They do a comparable amount of Python-side work (tokenising, hashing) but
+none of the real inference. TTS uses the built-in offline "silent" backend.
+'''
+
+EMBEDDING_DIM = 384
+LABELS = ("Negative", "Neutral", "Positive")
+
+
+class StubEncoder:
+    """
+    Hashed bag-of-words embeddings with the SentenceTransformer encode() interface.
+    """
+
+    def get_sentence_embedding_dimension(self):
+        return EMBEDDING_DIM
+
+    def encode(self, texts):
+        embeddings = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = hashlib.md5(word.encode()).digest()
+                embeddings[row, int.from_bytes(digest[:4], "little") % EMBEDDING_DIM] += 1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+def stub_sentiment_predict(texts, *args, **kwargs):
+    results = []
+    for text in texts:
+        digest = hashlib.md5(text.encode()).digest()
+        results.append({
+            "sentiment": LABELS[digest[0] % len(LABELS)],
+            "score": round(0.5 + digest[1] / 510, 3)
+        })
+    return results
+
+
+def install():
+    """
+    Replace the sentiment model, embedding model and gTTS with offline stand-ins.
+    """
+    from utils import ComparitiveAnalysis, SentimentAnalysis, TTSHindi
+
+    SentimentAnalysis._predict = stub_sentiment_predict
+    ComparitiveAnalysis._embedding_model.set(StubEncoder())
+    TTSHindi.set_tts_backend(TTSHindi.SilentBackend())
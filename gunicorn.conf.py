@@ -0,0 +1,61 @@
+import gc
+import glob
+import os
+
+'''
+Multi-process serving: gunicorn -c gunicorn.conf.py api:app
+The app is imported once in the master (preload_app) and the models are loaded there before the
+workers are forked, so every worker shares one copy of the weights copy-on-write instead of loading
+its own. Each worker gets a share of the CPUs for inference, so N workers do not oversubscribe them.
+'''
+
+# Metrics of every worker are written here and merged by /metrics; must be set before prometheus_client
+# is imported by the app
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/news-prometheus")
+# Tokenizer thread pools do not survive a fork, and the workers already use every core between them
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+for stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(stale)
+
+from utils import Config  # noqa: E402
+from utils.InferenceBackend import configure_torch_threads, cpu_quota, inference_threads  # noqa: E402
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 7860)}"
+workers = Config.WORKERS if "NEWS_WORKERS" in os.environ else cpu_quota()
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+
+# Read by the app when it is imported below, so its inference threads and summary pool are per-worker shares
+Config.WORKERS = workers
+if "NEWS_SUMMARY_WORKERS" not in os.environ:
+    Config.SUMMARY_WORKERS = max(1, Config.SUMMARY_WORKERS // workers)
+
+
+def when_ready(server):
+    # The app has been imported; load the models before any worker exists. Torch stays single-threaded
+    # in the master so that no thread pool is running when it forks.
+    if Config.PRELOAD_MODELS:
+        from utils.Models import preload
+
+        configure_torch_threads(1)
+        preload()
+
+
+def pre_fork(server, worker):
+    # Objects that exist now (model wrappers, modules) are left alone by the workers' garbage collector,
+    # which would otherwise write to their pages and unshare them
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    configure_torch_threads(inference_threads())
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,42 @@
+from utils.Dedup import deduplicate
+
+
+def _article(n, title, text=None):
+    return {"url": f"https://example{n}.com/story", "title": title, "text": text or f"Unrelated body number {n}."}
+
+
+def _kept_titles(articles, stages=("url", "title", "text")):
+    return [article["title"] for article in deduplicate(articles, stages)]
+
+
+def test_opposite_polarity_headlines_are_kept_apart():
+    titles = ["Nvidia stock rises 5% on Monday", "Nvidia stock falls 5% on Monday"]
+    assert _kept_titles([_article(n, title) for n, title in enumerate(titles)]) == titles
+
+
+def test_headlines_about_different_places_are_kept_apart():
+    titles = ["Apple launches iPhone 16 in India", "Apple launches iPhone 16 in China"]
+    assert _kept_titles([_article(n, title) for n, title in enumerate(titles)]) == titles
+
+
+def test_long_headlines_differing_in_one_word_are_kept_apart():
+    titles = [
+        "Nvidia shares rise sharply on Monday after the chipmaker reported record data center revenue",
+        "Nvidia shares fall sharply on Monday after the chipmaker reported record data center revenue",
+    ]
+    assert _kept_titles([_article(n, title) for n, title in enumerate(titles)], ("url", "title")) == titles
+
+
+def test_verbatim_headlines_collapse_on_title():
+    articles = [_article(0, "Tesla recalls 2 million cars"), _article(1, "Tesla Recalls 2 Million Cars!")]
+    assert _kept_titles(articles, ("url", "title")) == ["Tesla recalls 2 million cars"]
+    assert articles[0]["syndication_count"] == 2
+
+
+def test_rewritten_headlines_collapse_on_text():
+    body = " ".join(f"Sentence {i} of the wire report about the Tesla recall and its regulators." for i in range(20))
+    articles = [
+        _article(0, "Tesla recalls 2 million cars over Autopilot", body),
+        _article(1, "Tesla to recall two million vehicles in the US", body + " Reporting by a staff writer."),
+    ]
+    assert _kept_titles(articles) == ["Tesla recalls 2 million cars over Autopilot"]
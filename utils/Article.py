@@ -0,0 +1,157 @@
+from collections import Counter
+
+import numpy as np
+
+'''
+Article records passed through the pipeline.
+  - Article: one article as a slotted record. It also answers the mapping-style access
+    (article['title'], .get, .setdefault) used by the scraper, deduplicator and news index.
+  - ArticleBatch: the columnar form the analysis stages work on. Sentiment labels are interned into
+    small integer codes, scores and summary embeddings live in NumPy arrays, and article bodies are
+    left behind, so aggregations are single array operations and nothing is written back to the
+    articles (or request payloads) the batch was built from.
+'''
+
+FIELDS = (
+    "url", "title", "summary", "text", "publish_date", "sentiment", "sentiment_score", "topics",
+    "embedding", "syndication_count"
+)
+
+
+class Article:
+    __slots__ = FIELDS
+
+    def __init__(self, url="", title="", summary="", text=None, publish_date=None, sentiment=None,
+                 sentiment_score=None, topics=None, embedding=None, syndication_count=1):
+        self.url = url
+        self.title = title
+        self.summary = summary
+        self.text = text
+        self.publish_date = publish_date
+        self.sentiment = sentiment
+        self.sentiment_score = sentiment_score
+        self.topics = topics
+        self.embedding = embedding
+        self.syndication_count = syndication_count
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build an Article from a dict, ignoring keys that are not article fields.
+        """
+        return cls(**{field: data[field] for field in FIELDS if field in data})
+
+    def to_dict(self):
+        """
+        The fields that are set, as a plain dict (e.g. for a JSON response).
+        """
+        return {field: getattr(self, field) for field in FIELDS if getattr(self, field) is not None}
+
+    # Mapping-style access, so code written against article dicts keeps working
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in FIELDS and getattr(self, field) is not None
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in FIELDS else None
+        return default if value is None else value
+
+    def setdefault(self, field, default=None):
+        if self.get(field) is None:
+            self[field] = default
+        return self[field]
+
+    def keys(self):
+        return [field for field in FIELDS if getattr(self, field) is not None]
+
+    def copy(self):
+        return Article(**{field: getattr(self, field) for field in FIELDS})
+
+    def __repr__(self):
+        return f"Article(title={self.title!r}, url={self.url!r})"
+
+
+class ArticleBatch:
+    """
+    Columnar view of a list of articles (Article records or dicts) for the analysis stages.
+    Embeddings the articles carry are kept in one float32 matrix; rows still to be embedded are NaN.
+    """
+    __slots__ = (
+        "titles", "summaries", "labels", "sentiment_codes", "scores", "syndication_counts", "embeddings",
+        "topics"
+    )
+
+    def __init__(self, articles):
+        articles = list(articles)
+        self.titles = [article.get('title', "") for article in articles]
+        self.summaries = [article.get('summary', "") for article in articles]
+
+        codes = {}
+        self.sentiment_codes = np.fromiter(
+            (codes.setdefault(article.get('sentiment', "Unknown"), len(codes)) for article in articles),
+            dtype=np.int16, count=len(articles)
+        )
+        self.labels = tuple(codes)
+
+        scores = [article.get('sentiment_score') for article in articles]
+        self.scores = np.array(
+            [score if isinstance(score, (int, float)) else np.nan for score in scores], dtype=np.float64
+        )
+        self.syndication_counts = np.array(
+            [article.get('syndication_count', 1) for article in articles], dtype=np.int32
+        )
+
+        self.embeddings = None
+        given = [(i, article.get('embedding')) for i, article in enumerate(articles)]
+        given = [(i, vector) for i, vector in given if vector is not None]
+        if given:
+            self.embeddings = np.full((len(articles), len(given[0][1])), np.nan, dtype=np.float32)
+            rows, vectors = zip(*given)
+            self.embeddings[list(rows)] = np.vstack(vectors)
+
+        self.topics = [[] for _ in articles]
+
+    @classmethod
+    def of(cls, articles):
+        return articles if isinstance(articles, cls) else cls(articles)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def sentiment_counts(self):
+        """
+        Articles per sentiment label.
+        """
+        counts = np.bincount(self.sentiment_codes, minlength=len(self.labels))
+        return Counter({label: int(count) for label, count in zip(self.labels, counts) if count})
+
+    def average_score(self):
+        """
+        Mean sentiment score over the articles that have a numeric one, rounded to 3 places.
+        """
+        valid = self.scores[~np.isnan(self.scores)]
+        return round(float(valid.mean()), 3) if len(valid) else 0.0
+
+    def missing_embeddings(self):
+        """
+        Indices of the articles that have no summary embedding yet.
+        """
+        if self.embeddings is None:
+            return np.arange(len(self))
+        return np.flatnonzero(np.isnan(self.embeddings[:, 0]))
+
+    def set_embeddings(self, rows, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.embeddings is None:
+            self.embeddings = np.full((len(self), vectors.shape[1]), np.nan, dtype=np.float32)
+        self.embeddings[rows] = vectors
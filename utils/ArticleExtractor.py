@@ -0,0 +1,176 @@
+import re
+
+from lxml import etree
+
+from utils import Config
+
+'''
+Streaming main-content extraction on lxml's C parser.
+Pages are fed in chunks as they download. Boilerplate subtrees (scripts, styles, navigation, footers,
+sidebars, promos) are skipped, paragraphs are grouped by their parent block, and the highest-scoring
+blocks are kept as the article body. Finished elements are freed as parsing goes, so memory stays
+flat regardless of page size.
+'''
+
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "iframe", "form", "button", "select",
+    "nav", "header", "footer", "aside"
+}
+
+# Whole class names / ids that mark boilerplate containers. Only complete names match, so that
+# wrappers such as "content-wrapper share-enabled" or a body with "has-sidebar" are not skipped.
+SKIP_NAMES = {
+    "nav", "navbar", "navigation", "menu", "breadcrumb", "breadcrumbs", "header", "site-header", "footer",
+    "site-footer", "sidebar", "side-bar", "rail", "left-rail", "right-rail", "comment", "comments",
+    "comments-section", "promo", "ad", "ads", "advert", "advertisement", "banner", "cookie-banner",
+    "cookie-notice", "newsletter", "share", "share-buttons", "share-tools", "sharing", "social",
+    "social-share", "related", "related-articles", "related-posts", "most-read", "subscribe", "byline",
+    "meta", "caption", "credit"
+}
+# Page-level containers are never skipped for their class or id
+NEVER_SKIP_TAGS = {"html", "body", "main", "article"}
+
+MIN_PARAGRAPH_CHARS = 25
+MAX_LINK_DENSITY = 0.5
+# Blocks scoring at least this fraction of the best block are kept as part of the body
+SIBLING_SCORE_RATIO = 0.25
+# Below this many characters the body is considered not found and every paragraph is used
+MIN_BODY_CHARS = 200
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _is_boilerplate(element):
+    if element.tag in SKIP_TAGS:
+        return True
+    if element.tag in NEVER_SKIP_TAGS:
+        return False
+    names = f"{element.get('class', '')} {element.get('id', '')}".lower().split()
+    return any(name in SKIP_NAMES for name in names)
+
+
+class ArticleExtractor:
+    """
+    Incremental article body extractor. Call it with decoded chunks of HTML; it returns True once
+    `max_chars` of candidate paragraph text have been read, so the download can stop there.
+    Read the result from `text`.
+    """
+
+    def __init__(self, max_chars=Config.ARTICLE_MAX_CHARS):
+        self.max_chars = max_chars
+        self._parser = etree.HTMLPullParser(events=("start", "end"), remove_comments=True, remove_pis=True)
+        self._stack = []  # (block id, inside boilerplate) per open element
+        self._open_paragraphs = 0
+        self._next_block = 0
+        self._paragraphs = []  # (block id, text, score)
+        self._skipped = []  # text of paragraphs inside boilerplate, used only when nothing else is found
+        self.size = 0
+        self.done = False
+
+    def __call__(self, chunk):
+        return self.feed(chunk)
+
+    def feed(self, chunk):
+        if self.done:
+            return True
+        self._parser.feed(chunk)
+        self._process_events()
+        return self.done
+
+    def _process_events(self):
+        for event, element in self._parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+
+            if event == "start":
+                skipping = (self._stack and self._stack[-1][1]) or _is_boilerplate(element)
+                self._stack.append((self._next_block, skipping))
+                self._next_block += 1
+                if element.tag == "p":
+                    self._open_paragraphs += 1
+                continue
+
+            block, skipping = self._stack.pop() if self._stack else (None, False)
+            if element.tag == "p":
+                self._open_paragraphs = max(0, self._open_paragraphs - 1)
+                if skipping:
+                    self._add_skipped(element)
+                else:
+                    parent_block = self._stack[-1][0] if self._stack else None
+                    self._add_paragraph(parent_block, element)
+
+            # Free finished elements once no open paragraph still needs their text
+            if self._open_paragraphs:
+                continue
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+            if self.size >= self.max_chars:
+                self.done = True
+                return
+
+    @staticmethod
+    def _paragraph_text(element):
+        """
+        Whitespace-normalized text of a paragraph, or None when it is too short or mostly links.
+        """
+        text = _WHITESPACE.sub(" ", "".join(element.itertext())).strip()
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            return None
+        link_chars = sum(len("".join(a.itertext())) for a in element.iter("a"))
+        if link_chars / len(text) > MAX_LINK_DENSITY:
+            return None
+        return text
+
+    def _add_skipped(self, element):
+        if not self._paragraphs and sum(map(len, self._skipped)) < self.max_chars:
+            text = self._paragraph_text(element)
+            if text is not None:
+                self._skipped.append(text)
+
+    def _add_paragraph(self, block, element):
+        text = self._paragraph_text(element)
+        if text is None:
+            return
+
+        # Longer, sentence-like paragraphs count more (in the spirit of Readability's scoring)
+        score = 1 + min(len(text) / 100, 3) + text.count(",")
+        self._paragraphs.append((block, text, score))
+        self.size += len(text)
+
+    def close(self):
+        if not self.done:
+            try:
+                self._parser.close()
+            except etree.XMLSyntaxError:
+                pass
+            self._process_events()
+
+    @property
+    def text(self):
+        self.close()
+        if not self._paragraphs:
+            # Everything was taken for boilerplate: better every paragraph than nothing
+            return " ".join(self._skipped)[:self.max_chars]
+
+        block_scores = {}
+        for block, _, score in self._paragraphs:
+            block_scores[block] = block_scores.get(block, 0) + score
+        threshold = max(block_scores.values()) * SIBLING_SCORE_RATIO
+
+        body = [text for block, text, _ in self._paragraphs if block_scores[block] >= threshold]
+        if sum(len(text) for text in body) < MIN_BODY_CHARS:
+            body = [text for _, text, _ in self._paragraphs]
+        return " ".join(body)[:self.max_chars]
+
+
+def extract_main_text(html, max_chars=Config.ARTICLE_MAX_CHARS):
+    """
+    Extract the article body from a complete HTML string.
+    """
+    extractor = ArticleExtractor(max_chars)
+    extractor.feed(html)
+    return extractor.text
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from utils import Config
+from utils.Metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every stored entry after an incompatible change in how results are computed
+CACHE_VERSION = 1
+
+_MISSING = object()
+
+
+def content_hash(text):
+    """
+    md5 of a piece of content.
+    """
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache for model results keyed by (namespace, model, content hash).
+    A bounded in-memory LRU sits in front of a SQLite table; entries expire after `ttl` seconds
+    and the disk tier is trimmed to `max_disk_items`, least recently written first.
+    """
+
+    def __init__(self, path=Config.CACHE_PATH, max_memory_items=Config.CACHE_MEMORY_ITEMS,
+                 max_disk_items=Config.CACHE_DISK_ITEMS, ttl=Config.CACHE_TTL_SECONDS,
+                 enabled=Config.CACHE_ENABLED):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl = ttl
+        self.enabled = enabled
+
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._conn = None
+        self._writes_since_trim = 0
+        self._stats = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0})
+        self._evictions = 0
+
+    # ------------------ STORAGE ------------------ #
+
+    def _db(self):
+        if self._conn is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results(created)")
+                self._conn.commit()
+            except Exception as e:
+                logger.warning("Disk cache unavailable, using memory only: %s", e)
+                self.path = None
+                self._conn = None
+        return self._conn
+
+    @staticmethod
+    def _key(namespace, model, content_key):
+        return f"v{CACHE_VERSION}:{namespace}:{model}:{content_key}"
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _trim_disk(self, db):
+        now = time.time()
+        cursor = db.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+        self._evictions += cursor.rowcount
+        count = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_disk_items:
+            cursor = db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY created LIMIT ?)",
+                (count - self.max_disk_items,)
+            )
+            self._evictions += cursor.rowcount
+
+    # ------------------ PUBLIC API ------------------ #
+
+    def get(self, namespace, model, content_key, default=None):
+        if not self.enabled:
+            return default
+
+        key = self._key(namespace, model, content_key)
+        stats = self._stats[namespace]
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    stats["memory_hits"] += 1
+                    CACHE_LOOKUPS.labels(namespace, "memory_hit").inc()
+                    return entry[1]
+                del self._memory[key]
+
+            db = self._db()
+            if db is not None:
+                row = db.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    value = pickle.loads(row[0])
+                    self._remember(key, row[1], value)
+                    stats["disk_hits"] += 1
+                    CACHE_LOOKUPS.labels(namespace, "disk_hit").inc()
+                    return value
+
+            stats["misses"] += 1
+            CACHE_LOOKUPS.labels(namespace, "miss").inc()
+            return default
+
+    def set(self, namespace, model, content_key, value):
+        if not self.enabled:
+            return
+
+        key = self._key(namespace, model, content_key)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, now, value)
+            self._stats[namespace]["writes"] += 1
+
+            db = self._db()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now)
+                )
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= 500:
+                    self._writes_since_trim = 0
+                    self._trim_disk(db)
+                db.commit()
+            except Exception as e:
+                logger.warning("Cache write failed: %s", e)
+
+    def cached_map(self, namespace, model, items, compute, key_fn=content_hash):
+        """
+        Look up every item, compute only the misses in a single `compute(missing_items)` call,
+        store them, and return results in the order of `items`. Computed None values are not stored.
+        """
+        items = list(items)
+        keys = [key_fn(item) for item in items]
+        results = [self.get(namespace, model, key, _MISSING) for key in keys]
+
+        missing = [i for i, result in enumerate(results) if result is _MISSING]
+        if missing:
+            # Identical items within one call are computed once
+            first_index = {}
+            for i in missing:
+                first_index.setdefault(keys[i], i)
+            unique = list(first_index.values())
+
+            computed = compute([items[i] for i in unique])
+            by_key = {}
+            for i, value in zip(unique, computed):
+                by_key[keys[i]] = value
+                if value is not None:
+                    self.set(namespace, model, keys[i], value)
+            for i in missing:
+                results[i] = by_key[keys[i]]
+
+        return results
+
+    def stats(self):
+        with self._lock:
+            namespaces = {name: dict(counts) for name, counts in self._stats.items()}
+            return {
+                "namespaces": namespaces,
+                "memory_items": len(self._memory),
+                "evictions": self._evictions
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM results")
+                db.commit()
+
+
+# Shared cache instance used by the scraper and the model wrappers
+cache = ResultCache()
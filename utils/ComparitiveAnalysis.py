@@ -1,52 +1,237 @@
 from collections import Counter
-import statistics
 import re
-import itertools
-from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
-import os
+import numpy as np
 
+from utils import Config
+from utils.Article import ArticleBatch
+from utils.Cache import cache
+from utils.InferenceBackend import build_sentence_encoder, cache_model_name, check_backend
+from utils.Metrics import observe_batch, span
+from utils.Models import register
 
-'''
-# Load Sentence Transformer model from local directory
-model_path = os.path.join(os.path.dirname(__file__), "..", "hf_model")
-model = SentenceTransformer(model_path)
-'''
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 
-# Load Sentence Transformer model directly from Hugging Face
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Words that never appear in a keyphrase
+STOPWORDS = frozenset("""
+a about above across after again against all also am among an and any are as at be because been before
+being below between both but by can could did do does doing down during each either few for from further
+had has have having he her here hers him his how however i if in into is it its itself just last least
+less many may might month more most much must my near news new next no nor not now of off on once one only or other our
+ours out over own per report reports said same says she should since so some such than that the their
+theirs them then there these they this those through to today too under until up upon us very via was we
+week were what when where which while who whom whose why will with within without would year years yet you your
+""".split())
 
-def extract_topics(text, top_n=3):
+_PHRASE_BREAK = re.compile(r"[.,;:!?()\[\]{}\"“”‘’|/–—]+")
+_PHRASE_WORD = re.compile(r"[a-z][a-z'-]*[a-z]")
+
+
+def _load_embedding_model(backend=None):
+    backend = check_backend(backend or Config.EMBEDDING_BACKEND)
+    if Config.MODEL_SOURCE == "local":
+        # Load Sentence Transformer model from local directory
+        model = SentenceTransformer(Config.EMBEDDING_MODEL_PATH)
+    else:
+        # Load Sentence Transformer model directly from Hugging Face
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return build_sentence_encoder(model, EMBEDDING_MODEL_NAME, backend)
+
+
+_embedding_model = register("embedding", _load_embedding_model, fork_safe=Config.EMBEDDING_BACKEND != "onnx")
+
+
+def get_embedding_model():
     """
-    Extract key topics from article titles using simple NLP logic.
+    Returns the sentence transformer, loading it on first use.
     """
-    words = re.findall(r'\b[a-zA-Z]{4,}\b', text.lower())
-    stopwords = {
-        "about", "from", "with", "this", "that", "which", "have", "been", "they",
-        "will", "their", "into", "more", "news"
-    }
-    filtered = [w for w in words if w not in stopwords]
-    return list(dict(Counter(filtered).most_common(top_n)).keys())
+    return _embedding_model.get()
+
+
+def encode_texts(texts, cached=True):
+    """
+    Embed texts with the sentence transformer, reusing cached embeddings of previously seen texts.
+    With `cached=False` the result cache is neither read nor written (e.g. for throwaway phrases).
+    Returns: 2D numpy array with one row per text
+    """
+    model = get_embedding_model()
+
+    def compute(missing):
+        observe_batch("embedding", len(missing))
+        return list(model.encode(missing))
+
+    with span("embed"):
+        if cached:
+            embeddings = cache.cached_map(
+                "embedding", cache_model_name(EMBEDDING_MODEL_NAME, Config.EMBEDDING_BACKEND), texts, compute
+            )
+        else:
+            embeddings = compute(list(texts)) if len(texts) else []
+    return np.vstack(embeddings) if embeddings else np.zeros((0, model.get_sentence_embedding_dimension()))
+
+
+def summary_embeddings(articles):
+    """
+    One embedding row per article summary. Embeddings the articles already carry (e.g. from the news
+    index) are reused and only the others are encoded.
+    """
+    batch = ArticleBatch.of(articles)
+    if not len(batch):
+        return np.zeros((0, 0), dtype=np.float32)
+    missing = batch.missing_embeddings()
+    if len(missing):
+        batch.set_embeddings(missing, encode_texts([batch.summaries[i] for i in missing]))
+    return batch.embeddings
+
+
+def _normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+# ------------------ TOPIC CLUSTERS ------------------ #
+
+def cluster_embeddings(embeddings, threshold=Config.TOPIC_CLUSTER_THRESHOLD):
+    """
+    Average-linkage agglomerative clustering on cosine similarity: the two most similar clusters are
+    merged until no pair is more similar than `threshold`. Cluster similarities are updated with the
+    Lance-Williams formula, so each merge is a single vectorized row update.
+    Returns: cluster label per row, numbered in order of first appearance
+    """
+    n = len(embeddings)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    normalized = _normalize(embeddings)
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, -np.inf)
+    sizes = np.ones(n)
+    owner = np.arange(n)
+
+    while n > 1:
+        a, b = divmod(int(np.argmax(similarity)), n)  # a < b: the first maximum is in the upper triangle
+        if similarity[a, b] <= threshold:
+            break
+        merged = (sizes[a] * similarity[a] + sizes[b] * similarity[b]) / (sizes[a] + sizes[b])
+        similarity[a, :] = merged
+        similarity[:, a] = merged
+        similarity[a, a] = -np.inf
+        similarity[b, :] = -np.inf
+        similarity[:, b] = -np.inf
+        sizes[a] += sizes[b]
+        owner[owner == b] = a
+
+    # Each cluster is owned by its first member, so sorted owners are in order of first appearance
+    return np.unique(owner, return_inverse=True)[1]
+
+
+def candidate_phrases(text, max_words=Config.TOPIC_MAX_WORDS, exclude=frozenset()):
+    """
+    Keyphrase candidates of a text: runs of up to max_words consecutive words that do not cross
+    punctuation and contain no stopword or `exclude` word. Single words need at least 4 letters.
+    """
+    phrases = set()
+    for fragment in _PHRASE_BREAK.split(text.lower()):
+        run = []
+        for word in _PHRASE_WORD.findall(fragment) + [""]:
+            word = word.removesuffix("'s")
+            if word and len(word) > 2 and word not in STOPWORDS and word not in exclude:
+                run.append(word)
+                continue
+            for size in range(1, max_words + 1):
+                for start in range(len(run) - size + 1):
+                    if size > 1 or len(run[start]) >= 4:
+                        phrases.add(" ".join(run[start:start + size]))
+            run = []
+    return phrases
+
+
+def label_topic_clusters(texts, embeddings, labels, top_n=3, exclude=()):
+    """
+    Keyphrases of each cluster: the candidate phrases found in most of its texts, ranked by cosine
+    similarity to the cluster's centroid embedding. Every cluster's candidates are embedded in one pass.
+    Returns: list of keyphrase lists, indexed by cluster label
+    """
+    exclude_words = {word for name in exclude for word in re.findall(r"[a-z]+", name.lower())}
+    normalized = _normalize(embeddings) if len(labels) else None
+
+    candidates = []
+    for cluster in range(int(labels.max()) + 1 if len(labels) else 0):
+        counts = Counter()
+        for i in np.flatnonzero(labels == cluster):
+            counts.update(candidate_phrases(texts[i], exclude=exclude_words))
+        ranked = sorted(counts, key=lambda phrase: (-counts[phrase], -phrase.count(" "), phrase))
+        candidates.append(ranked[:Config.TOPIC_CANDIDATES])
+
+    vocabulary = sorted({phrase for ranked in candidates for phrase in ranked})
+    if not vocabulary:
+        return [[] for _ in candidates]
+    # Candidate phrases change with every batch, so they would only crowd the result cache
+    phrase_vectors = _normalize(encode_texts(vocabulary, cached=False))
+    row = {phrase: i for i, phrase in enumerate(vocabulary)}
+
+    topics = []
+    for cluster, ranked in enumerate(candidates):
+        chosen, keyphrases = [], []
+        if ranked:
+            centroid = normalized[labels == cluster].mean(axis=0)
+            scores = phrase_vectors[[row[phrase] for phrase in ranked]] @ centroid
+            for k in np.argsort(-scores, kind="stable"):
+                words = set(ranked[k].split())
+                # Skip phrases mostly made of the words of an already chosen one
+                if any(2 * len(words & other) > min(len(words), len(other)) for other in chosen):
+                    continue
+                chosen.append(words)
+                keyphrases.append(ranked[k])
+                if len(chosen) == top_n:
+                    break
+        topics.append(keyphrases)
+    return topics
+
+
+def extract_semantic_topics(articles, embeddings, top_n=3, exclude=()):
+    """
+    Group articles into topic clusters by their summary embeddings and label each cluster with
+    keyphrases from its titles and summaries. `exclude` names (e.g. the company) never appear in labels.
+    Returns: (cluster label per article, keyphrases per cluster)
+    """
+    batch = ArticleBatch.of(articles)
+    with span("topics"):
+        labels = cluster_embeddings(embeddings)
+        texts = [f"{title}. {summary}" for title, summary in zip(batch.titles, batch.summaries)]
+        return labels, label_topic_clusters(texts, embeddings, labels, top_n, exclude)
 
 
 def sentiment_distribution(articles):
-    sentiments = [a['sentiment'] for a in articles]
-    scores = [a['sentiment_score'] for a in articles if isinstance(a['sentiment_score'], (int, float))]
-    return Counter(sentiments), round(statistics.mean(scores), 3) if scores else 0.0
+    """
+    Articles per sentiment label and the average sentiment score.
+    """
+    batch = ArticleBatch.of(articles)
+    return batch.sentiment_counts(), batch.average_score()
 
 
-def topic_overlap(articles):
-    all_topics = [set(a.get('topics', [])) for a in articles]
-    flat_topics = list(itertools.chain.from_iterable(all_topics))
-    common_topics = [item for item, count in Counter(flat_topics).items() if count > 1]
+def topic_overlap(articles, labels=None, cluster_topics=None):
+    """
+    Topics covered by several articles vs. by a single one, from the articles' topic clusters
+    (computed from their summary embeddings unless given).
+    """
+    if labels is None:
+        batch = ArticleBatch.of(articles)
+        labels, cluster_topics = extract_semantic_topics(batch, summary_embeddings(batch))
+    sizes = np.bincount(labels, minlength=len(cluster_topics))
+    common_topics = [topic for cluster, topics in enumerate(cluster_topics) if sizes[cluster] > 1 for topic in topics]
 
     topic_dict = {
-        "Common Topics": list(set(common_topics))
+        "Common Topics": list(dict.fromkeys(common_topics)),
+        "Topic Clusters": [
+            {"Topics": topics, "Articles": [int(i) + 1 for i in np.flatnonzero(labels == cluster)]}
+            for cluster, topics in enumerate(cluster_topics)
+        ]
     }
 
-    for i, topics in enumerate(all_topics):
-        unique = list(topics - set(common_topics))
-        topic_dict[f"Unique Topics in Article {i+1}"] = unique
+    for i, label in enumerate(labels):
+        unique = cluster_topics[label] if sizes[label] == 1 else []
+        topic_dict[f"Unique Topics in Article {i+1}"] = [topic for topic in unique if topic not in common_topics]
 
     return topic_dict
 
@@ -64,23 +249,56 @@ def generate_impact_narrative(summary1, summary2, similarity_score):
         return "These articles explore different aspects altogether, reflecting a diverse range of news angles around the company."
 
 
-def generate_coverage_comparisons(articles):
+def pairwise_similarities(embeddings):
+    """
+    Cosine similarity of every unordered pair of rows, from one normalized matrix product.
+    Returns: (rows, cols, scores) for the upper triangle, in itertools.combinations order
+    """
+    normalized = _normalize(embeddings)
+    rows, cols = np.triu_indices(len(normalized), k=1)
+    similarity = normalized @ normalized.T
+    return rows, cols, similarity[rows, cols]
+
+
+def select_extreme_pairs(scores, top_k):
+    """
+    Indices of the top_k most similar and top_k least similar pairs, most similar first.
+    """
+    ranked = np.argsort(-scores, kind="stable")
+    if 2 * top_k >= len(ranked):
+        return ranked
+    return np.concatenate([ranked[:top_k], ranked[len(ranked) - top_k:]])
+
+
+def generate_coverage_comparisons(articles, top_k=None, embeddings=None):
+    """
+    Compare the coverage of every pair of articles by the similarity of their summaries.
+    With top_k set, only the top_k most similar and top_k least similar pairs are reported.
+    `embeddings` (one row per article) defaults to summary_embeddings(articles).
+    """
     comparisons = []
     if len(articles) < 2:
         return comparisons
 
-    article_pairs = list(itertools.combinations(enumerate(articles), 2))
+    batch = ArticleBatch.of(articles)
+    if embeddings is None:
+        embeddings = summary_embeddings(batch)
+    with span("compare"):
+        rows, cols, scores = pairwise_similarities(embeddings)
 
-    summaries = [article["summary"] for article in articles]
-    embeddings = model.encode(summaries)
+    if top_k is None:
+        selected = range(len(scores))
+    else:
+        selected = select_extreme_pairs(scores, top_k)
 
-    for (i1, a1), (i2, a2) in article_pairs:
-        sim_score = cosine_similarity([embeddings[i1]], [embeddings[i2]])[0][0]
+    for p in selected:
+        i1, i2 = int(rows[p]), int(cols[p])
+        s1, s2 = batch.summaries[i1], batch.summaries[i2]
         comparison = (
-            f"Article {i1 + 1} discusses: '{a1['summary']}'\n"
-            f"Article {i2 + 1} discusses: '{a2['summary']}'"
+            f"Article {i1 + 1} discusses: '{s1}'\n"
+            f"Article {i2 + 1} discusses: '{s2}'"
         )
-        impact = generate_impact_narrative(a1['summary'], a2['summary'], sim_score)
+        impact = generate_impact_narrative(s1, s2, float(scores[p]))
 
         comparisons.append({
             "Comparison": comparison,
@@ -106,29 +324,68 @@ def generate_sentiment_summary(articles, company_name="The company"):
         return f"{company_name}'s coverage appears mixed, presenting a range of contrasting perspectives."
 
 
-def generate_structured_analysis(company, articles):
-    for article in articles:
-        article['topics'] = extract_topics(article['title'])
+def generate_comparative_sentiment_score(articles, top_k=None, company=None):
+    """
+    Sentiment distribution, coverage differences and topic overlap of a set of articles. The summaries
+    are embedded once and that matrix feeds both the topic clusters and the pairwise comparisons.
+    The keyphrases of each article's cluster are recorded in the batch's `topics` column; the articles
+    themselves are left untouched.
+    """
+    batch = ArticleBatch.of(articles)
+    embeddings = summary_embeddings(batch)
+    labels, cluster_topics = extract_semantic_topics(batch, embeddings, exclude=(company,) if company else ())
+    batch.topics = [list(cluster_topics[label]) for label in labels]
 
-    sentiment_dist, avg_score = sentiment_distribution(articles)
+    return {
+        "Sentiment Distribution": dict(batch.sentiment_counts()),
+        "Coverage Differences": generate_coverage_comparisons(batch, top_k=top_k, embeddings=embeddings),
+        "Topic Overlap": topic_overlap(batch, labels, cluster_topics)
+    }
+
+
+def generate_structured_analysis(company, articles, top_k=None):
+    batch = ArticleBatch.of(articles)
+    comparative_score = generate_comparative_sentiment_score(batch, top_k=top_k, company=company)
 
     report = {
         "Company": company,
         "Articles": [
             {
-                "Title": a['title'],
-                "Summary": a['summary'],
-                "Sentiment": a['sentiment'],
-                "Topics": a['topics']
+                "Title": title,
+                "Summary": summary,
+                "Sentiment": batch.labels[code],
+                "Topics": topics,
+                "Syndication Count": int(count)
             }
-            for a in articles
+            for title, summary, code, topics, count in zip(
+                batch.titles, batch.summaries, batch.sentiment_codes, batch.topics, batch.syndication_counts
+            )
         ],
-        "Comparative Sentiment Score": {
-            "Sentiment Distribution": dict(sentiment_dist),
-            "Coverage Differences": generate_coverage_comparisons(articles),
-            "Topic Overlap": topic_overlap(articles)
-        },
-        "Final Sentiment Analysis": generate_sentiment_summary(articles, company)
+        "Comparative Sentiment Score": comparative_score,
+        "Final Sentiment Analysis": generate_sentiment_summary(batch, company)
     }
 
     return report
+
+
+def generate_batch_analysis(articles_by_company, top_k=None):
+    """
+    generate_structured_analysis for many companies at once. Summaries of every company's articles
+    that do not already carry an embedding are embedded together in one batched pass.
+    Returns: {company: report}
+    """
+    batches = {company: ArticleBatch(articles) for company, articles in articles_by_company.items()}
+    missing = [(batch, batch.missing_embeddings()) for batch in batches.values()]
+    texts = [batch.summaries[i] for batch, rows in missing for i in rows]
+    if texts:
+        embeddings = encode_texts(texts)
+        start = 0
+        for batch, rows in missing:
+            if len(rows):
+                batch.set_embeddings(rows, embeddings[start:start + len(rows)])
+                start += len(rows)
+
+    return {
+        company: generate_structured_analysis(company, batch, top_k=top_k)
+        for company, batch in batches.items()
+    }
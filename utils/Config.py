@@ -0,0 +1,180 @@
+import os
+
+'''
+Runtime settings, overridable through environment variables.
+'''
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ------------------ NEWS SOURCES ------------------ #
+
+# Bing News search endpoint; the benchmark harness points this at a local fixture server
+BING_NEWS_URL = os.environ.get("NEWS_BING_URL", "https://www.bing.com/news/search")
+
+# Articles analyzed per company report; also the largest article count an audio report id can name
+REPORT_ARTICLES = int(os.environ.get("NEWS_REPORT_ARTICLES", 10))
+
+# Largest number of companies accepted by one /analyze/batch request
+BATCH_MAX_COMPANIES = int(os.environ.get("NEWS_BATCH_MAX_COMPANIES", 100))
+
+
+# ------------------ RESULT CACHE ------------------ #
+
+CACHE_ENABLED = _env_bool("NEWS_CACHE_ENABLED", True)
+CACHE_PATH = os.environ.get("NEWS_CACHE_PATH", os.path.join(BASE_DIR, "cache", "results.sqlite3"))
+CACHE_MEMORY_ITEMS = int(os.environ.get("NEWS_CACHE_MEMORY_ITEMS", 2048))
+CACHE_DISK_ITEMS = int(os.environ.get("NEWS_CACHE_DISK_ITEMS", 100000))
+CACHE_TTL_SECONDS = float(os.environ.get("NEWS_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+
+# ------------------ NEWS INDEX ------------------ #
+
+INDEX_ENABLED = _env_bool("NEWS_INDEX_ENABLED", True)
+INDEX_PATH = os.environ.get("NEWS_INDEX_PATH", os.path.join(BASE_DIR, "cache", "news_index.sqlite3"))
+INDEX_MAX_ARTICLES = int(os.environ.get("NEWS_INDEX_MAX_ARTICLES", 500))  # kept per company
+# Requests are answered from the index without touching the feed while it is younger than this
+INDEX_MAX_AGE_SECONDS = float(os.environ.get("NEWS_INDEX_MAX_AGE_SECONDS", 900))
+# How often watched companies are refreshed in the background, and how many new items one refresh processes
+INDEX_REFRESH_SECONDS = float(os.environ.get("NEWS_INDEX_REFRESH_SECONDS", 600))
+INDEX_REFRESH_LIMIT = int(os.environ.get("NEWS_INDEX_REFRESH_LIMIT", 20))
+# Comma-separated company names refreshed in the background from startup
+WATCHED_COMPANIES = [c.strip() for c in os.environ.get("NEWS_WATCHED_COMPANIES", "").split(",") if c.strip()]
+
+
+# ------------------ VECTOR STORE ------------------ #
+
+# Summary embeddings of every indexed article, searchable across companies and reports
+VECTOR_STORE_ENABLED = _env_bool("NEWS_VECTOR_STORE_ENABLED", True)
+VECTOR_STORE_DIR = os.environ.get("NEWS_VECTOR_STORE_DIR", os.path.join(BASE_DIR, "cache", "vectors"))
+# Below this many vectors searches are exact; above it an IVF index is trained and kept up to date
+VECTOR_TRAIN_MIN = int(os.environ.get("NEWS_VECTOR_TRAIN_MIN", 4096))
+# Inverted lists scanned per query: higher is more accurate and slower
+VECTOR_NPROBE = int(os.environ.get("NEWS_VECTOR_NPROBE", 8))
+
+
+# ------------------ SERVER ------------------ #
+
+# Server processes sharing the machine; gunicorn.conf.py sets this to its worker count so that each
+# process sizes its inference threads and summary pool to a share of the CPUs
+WORKERS = int(os.environ.get("NEWS_WORKERS", 1))
+# Load the models in the gunicorn master before it forks, so workers share the weights copy-on-write
+PRELOAD_MODELS = _env_bool("NEWS_PRELOAD_MODELS", True)
+
+
+# ------------------ EXECUTORS ------------------ #
+
+SUMMARY_WORKERS = int(os.environ.get("NEWS_SUMMARY_WORKERS", min(4, os.cpu_count() or 1)))
+SUMMARY_QUEUE_LIMIT = int(os.environ.get("NEWS_SUMMARY_QUEUE_LIMIT", 256))
+MODEL_QUEUE_LIMIT = int(os.environ.get("NEWS_MODEL_QUEUE_LIMIT", 32))
+IO_WORKERS = int(os.environ.get("NEWS_IO_WORKERS", 8))
+IO_QUEUE_LIMIT = int(os.environ.get("NEWS_IO_QUEUE_LIMIT", 64))
+
+
+# ------------------ JOBS ------------------ #
+
+# Concurrent /analyze pipelines, and jobs allowed to wait for one before new ones are rejected
+JOB_WORKERS = int(os.environ.get("NEWS_JOB_WORKERS", 4))
+JOB_QUEUE_LIMIT = int(os.environ.get("NEWS_JOB_QUEUE_LIMIT", 100))
+# Finished results are served to identical requests for this long, and pollable until then
+JOB_RESULT_TTL_SECONDS = float(os.environ.get("NEWS_JOB_RESULT_TTL_SECONDS", 60))
+# Job states are recorded here so that any server process can answer /jobs/{id}
+JOB_RECORDS_PATH = os.environ.get("NEWS_JOB_RECORDS_PATH", os.path.join(BASE_DIR, "cache", "jobs.sqlite3"))
+
+
+# ------------------ MODELS ------------------ #
+
+# "hub" downloads models from Hugging Face; "local" loads them from LOCAL_MODEL_DIR
+MODEL_SOURCE = os.environ.get("NEWS_MODEL_SOURCE", "hub").strip().lower()
+LOCAL_MODEL_DIR = os.environ.get("NEWS_LOCAL_MODEL_DIR", os.path.join(BASE_DIR, "hf_model"))
+SENTIMENT_MODEL_PATH = os.environ.get("NEWS_SENTIMENT_MODEL_PATH", os.path.join(LOCAL_MODEL_DIR, "model"))
+SENTIMENT_TOKENIZER_PATH = os.environ.get("NEWS_SENTIMENT_TOKENIZER_PATH", os.path.join(LOCAL_MODEL_DIR, "tokenizer"))
+EMBEDDING_MODEL_PATH = os.environ.get("NEWS_EMBEDDING_MODEL_PATH", LOCAL_MODEL_DIR)
+NLTK_DATA_DIR = os.environ.get("NEWS_NLTK_DATA_DIR", os.path.join(BASE_DIR, "utils", "nltk_data"))
+
+# Load every model in a background thread at startup instead of on first use
+WARMUP_MODELS = _env_bool("NEWS_WARMUP_MODELS", True)
+
+# CPU inference backend: "torch" (fp32), "torch-int8" (dynamic quantization) or "onnx" (ONNX Runtime);
+# settable for both models at once or per model
+INFERENCE_BACKEND = os.environ.get("NEWS_INFERENCE_BACKEND", "torch").strip().lower()
+SENTIMENT_BACKEND = os.environ.get("NEWS_SENTIMENT_BACKEND", INFERENCE_BACKEND).strip().lower()
+EMBEDDING_BACKEND = os.environ.get("NEWS_EMBEDDING_BACKEND", INFERENCE_BACKEND).strip().lower()
+# Threads per inference call; 0 sizes it to the container's CPU quota
+INFERENCE_THREADS = int(os.environ.get("NEWS_INFERENCE_THREADS", 0))
+# Exported ONNX graphs are written here once and reused
+ONNX_DIR = os.environ.get("NEWS_ONNX_DIR", os.path.join(BASE_DIR, "cache", "onnx"))
+
+
+# ------------------ SUMMARIZER ------------------ #
+
+# "lexrank" is the in-house vectorized LexRank; "sumy" is the original sumy implementation
+SUMMARIZER_BACKEND = os.environ.get("NEWS_SUMMARIZER_BACKEND", "lexrank").strip().lower()
+
+
+# ------------------ DEDUPLICATION ------------------ #
+
+# Estimated Jaccard similarity above which two titles / article texts are treated as the same story.
+# Titles are merged on their own only when they are (nearly) word for word the same: headlines that
+# differ in one word ("rises" / "falls", "India" / "China") are different stories, and are left to the
+# text stage to compare.
+DEDUP_TITLE_THRESHOLD = float(os.environ.get("NEWS_DEDUP_TITLE_THRESHOLD", 0.9))
+DEDUP_TEXT_THRESHOLD = float(os.environ.get("NEWS_DEDUP_TEXT_THRESHOLD", 0.5))
+TITLE_SHINGLE_SIZE = 2  # words per shingle
+TEXT_SHINGLE_SIZE = 3
+# 128 permutations in 32 bands of 4 rows: pairs above ~0.42 similarity share a bucket
+MINHASH_PERMUTATIONS = int(os.environ.get("NEWS_MINHASH_PERMUTATIONS", 128))
+LSH_BANDS = int(os.environ.get("NEWS_LSH_BANDS", 32))
+
+
+# ------------------ TOPICS ------------------ #
+
+# Average cosine similarity of summary embeddings above which articles share a topic cluster
+TOPIC_CLUSTER_THRESHOLD = float(os.environ.get("NEWS_TOPIC_CLUSTER_THRESHOLD", 0.5))
+TOPIC_CANDIDATES = 20  # most frequent candidate phrases per cluster scored against its centroid
+TOPIC_MAX_WORDS = 3  # longest keyphrase
+
+
+# ------------------ TEXT TO SPEECH ------------------ #
+
+# "gtts" uses Google Text-to-Speech; "silent" is an offline stand-in for tests and benchmarks
+TTS_BACKEND = os.environ.get("NEWS_TTS_BACKEND", "gtts").strip().lower()
+
+
+# ------------------ RESPONSES ------------------ #
+
+# Responses at least this large are compressed (brotli if installed and accepted, else gzip)
+COMPRESSION_MIN_BYTES = int(os.environ.get("NEWS_COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("NEWS_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("NEWS_BROTLI_QUALITY", 5))
+# How long clients may reuse an audio report before revalidating it with its ETag
+AUDIO_MAX_AGE_SECONDS = int(os.environ.get("NEWS_AUDIO_MAX_AGE_SECONDS", 3600))
+
+
+# ------------------ LOGGING ------------------ #
+
+LOG_LEVEL = os.environ.get("NEWS_LOG_LEVEL", "INFO").strip().upper()
+# "text" for people, "json" for log collectors
+LOG_FORMAT = os.environ.get("NEWS_LOG_FORMAT", "text").strip().lower()
+
+
+# ------------------ HTTP CLIENT ------------------ #
+
+HTTP_TIMEOUT = float(os.environ.get("NEWS_HTTP_TIMEOUT", 10))
+HTTP_RETRIES = int(os.environ.get("NEWS_HTTP_RETRIES", 3))
+HTTP_BACKOFF_BASE = float(os.environ.get("NEWS_HTTP_BACKOFF_BASE", 0.5))
+HTTP_BACKOFF_MAX = float(os.environ.get("NEWS_HTTP_BACKOFF_MAX", 8))
+HTTP_POOL_HOSTS = int(os.environ.get("NEWS_HTTP_POOL_HOSTS", 32))
+HTTP_POOL_SIZE = int(os.environ.get("NEWS_HTTP_POOL_SIZE", 8))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("NEWS_HTTP_MAX_CONNECTIONS", 64))
+HTTP_MAX_PAGE_BYTES = int(os.environ.get("NEWS_HTTP_MAX_PAGE_BYTES", 2 * 1024 * 1024))
+
+# Stop reading an article page once this much paragraph text has been collected
+ARTICLE_MAX_CHARS = int(os.environ.get("NEWS_ARTICLE_MAX_CHARS", 20000))
@@ -0,0 +1,247 @@
+import re
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+from utils import Config
+from utils.Metrics import ARTICLES_COLLAPSED, span
+
+'''
+Near-duplicate detection for syndicated news.
+URLs are canonicalized (redirect wrappers unwrapped, tracking parameters dropped), and titles / article
+texts are compared with MinHash signatures bucketed by LSH bands, so each new article is only checked
+against the handful of articles sharing a bucket rather than the whole corpus.
+'''
+
+# Query parameters that only track the click and never change the page
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "mc_cid", "mc_eid", "ocid", "cmpid", "cvid", "ei",
+    "form", "ref", "ref_src", "referrer", "smid", "smtyp", "taid", "guccounter", "guce_referrer",
+    "guce_referrer_sig", "_ga", "_gl", "igshid", "sr_share", "partner", "feature", "src", "source"
+}
+TRACKING_PREFIXES = ("utm_", "itm_", "at_", "pk_", "mkt_")
+
+# Redirect wrappers that carry the article URL in a query parameter (e.g. Bing's apiclick.aspx)
+REDIRECT_PARAMS = ("url", "u", "r")
+
+_WORD = re.compile(r"\w+")
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def canonicalize_url(url):
+    """
+    Canonical form of an article URL, so the same story reached through a redirect wrapper, a tracking
+    link or an AMP variant maps to one key.
+    """
+    parts = urlsplit(url.strip())
+    query = parse_qsl(parts.query, keep_blank_values=True)
+
+    for name, value in query:
+        if name.lower() in REDIRECT_PARAMS and value.startswith(("http://", "https://")):
+            return canonicalize_url(value)
+
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.startswith("amp."):
+        host = host[4:]
+
+    path = re.sub(r"/amp/?$|\.amp$", "", parts.path) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    kept = sorted(
+        (name, value) for name, value in query
+        if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, path, urlencode(kept), ""))
+
+
+def shingles(text, size):
+    """
+    Hashed word `size`-grams of a text, as a uint64 array.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """
+    MinHash signatures from `num_perm` universal hash functions (a*x + b) mod p, computed for all
+    functions at once with NumPy.
+    """
+
+    def __init__(self, num_perm=Config.MINHASH_PERMUTATIONS, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, hashes):
+        if not len(hashes):
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        values = (self.a[:, None] * (hashes[None, :] % _MERSENNE_PRIME) + self.b[:, None]) % _MERSENNE_PRIME
+        return values.min(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    Incremental LSH index. `add(key, text)` returns the key of an earlier near-duplicate (estimated
+    Jaccard similarity of shingles >= threshold), or None after indexing the text as a new entry.
+    Only entries sharing at least one band bucket are compared, so each lookup stays cheap as the
+    index grows.
+    """
+
+    def __init__(self, shingle_size, threshold, bands=Config.LSH_BANDS, hasher=None):
+        self.hasher = hasher or _default_hasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"{self.hasher.num_perm} permutations cannot be split into {bands} bands")
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.buckets = {}
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, text):
+        """
+        Key of the most similar indexed near-duplicate of `text`, or None.
+        """
+        return self._find(self.hasher.signature(shingles(text, self.shingle_size)))[0]
+
+    def _find(self, signature):
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+
+        best, best_similarity = None, self.threshold
+        for key in candidates:
+            similarity = float(np.mean(self.signatures[key] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best, signature
+
+    def add(self, key, text):
+        match, signature = self._find(self.hasher.signature(shingles(text, self.shingle_size)))
+        if match is not None:
+            return match
+        self._insert(key, signature)
+        return None
+
+    def insert(self, key, text):
+        """
+        Index `text` unconditionally, without looking for duplicates.
+        """
+        self._insert(key, self.hasher.signature(shingles(text, self.shingle_size)))
+
+    def _insert(self, key, signature):
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+
+
+_hasher = None
+
+
+def _default_hasher():
+    global _hasher
+    if _hasher is None:
+        _hasher = MinHasher()
+    return _hasher
+
+
+class ArticleDeduplicator:
+    """
+    Collapses syndicated copies of a story onto the first copy seen.
+    Articles are checked in stages as information arrives: `by_url` and `by_title` before the page
+    is fetched, `by_text` once the article text is known. Each representative carries a
+    'syndication_count' of how many copies it stands for; the dropped copies are kept in `collapsed`.
+    """
+
+    def __init__(self):
+        self.collapsed = []
+        self.urls = {}
+        self.titles = NearDuplicateIndex(Config.TITLE_SHINGLE_SIZE, Config.DEDUP_TITLE_THRESHOLD)
+        self.texts = NearDuplicateIndex(Config.TEXT_SHINGLE_SIZE, Config.DEDUP_TEXT_THRESHOLD)
+        self.representatives = {}
+
+    def seed(self, articles):
+        """
+        Register already-accepted articles (e.g. from the news index) as representatives, so later
+        copies collapse onto them. Seeded articles are not checked against each other.
+        """
+        for article in articles:
+            article.setdefault('syndication_count', 1)
+            self.urls.setdefault(canonicalize_url(article['url']), article)
+            self.titles.insert(id(article), article['title'])
+            self.texts.insert(id(article), article.get('text') or article['summary'])
+            self.representatives[id(article)] = article
+
+    def _collapse(self, article, representative, check):
+        self.collapsed.append(article)
+        ARTICLES_COLLAPSED.labels(check).inc()
+        representative['syndication_count'] = (
+            representative.get('syndication_count', 1) + article.get('syndication_count', 1)
+        )
+        return False
+
+    def by_url(self, article):
+        """
+        True if the article is new; False if its canonical URL was already seen.
+        """
+        canonical = canonicalize_url(article['url'])
+        article.setdefault('syndication_count', 1)
+        if canonical in self.urls:
+            return self._collapse(article, self.urls[canonical], "url")
+        self.urls[canonical] = article
+        return True
+
+    def by_title(self, article):
+        """
+        True if the article is new; False if its title is a near-verbatim copy of an earlier one. Titles
+        that only share most of their words are left for by_text to compare.
+        """
+        article.setdefault('syndication_count', 1)
+        match = self.titles.add(id(article), article['title'])
+        if match is not None:
+            return self._collapse(article, self.representatives[match], "title")
+        self.representatives[id(article)] = article
+        return True
+
+    def by_text(self, article):
+        """
+        True if the article is new; False if its text is a near-duplicate of an earlier article's.
+        """
+        article.setdefault('syndication_count', 1)
+        match = self.texts.add(id(article), article.get('text') or article['summary'])
+        if match is not None:
+            return self._collapse(article, self.representatives[match], "text")
+        self.representatives[id(article)] = article
+        return True
+
+    def filter(self, articles, *stages):
+        """
+        Articles that pass every given stage ('url', 'title', 'text'), in their original order.
+        """
+        checks = [getattr(self, f"by_{stage}") for stage in stages]
+        with span("dedup"):
+            return [article for article in articles if all(check(article) for check in checks)]
+
+
+def deduplicate(articles, stages=("url", "title", "text")):
+    """
+    One-shot near-duplicate collapse of a list of articles.
+    """
+    return ArticleDeduplicator().filter(articles, *stages)
@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils import Config
+from utils.Metrics import EXECUTOR_REJECTIONS
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when an executor already holds its maximum number of queued and running tasks.
+    """
+
+
+class BoundedExecutor:
+    """
+    Wraps a thread or process pool with a cap on queued + running tasks.
+    Submissions beyond the cap are rejected immediately so callers can shed load.
+    The underlying pool is created on first use. Thread pools run each task in a copy of the submitter's
+    context, so per-request state such as timing collection follows the work.
+    """
+
+    def __init__(self, name, factory, max_pending, copy_context=True):
+        self.name = name
+        self.max_pending = max_pending
+        self.copy_context = copy_context
+        self._factory = factory
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory()
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            EXECUTOR_REJECTIONS.labels(self.name).inc()
+            raise ExecutorSaturated(f"The {self.name} executor is busy, please retry shortly.")
+        if self.copy_context:
+            fn, args = contextvars.copy_context().run, (fn, *args)
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def _process_pool(workers):
+    # spawn avoids forking a multi-threaded server process
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+EXECUTORS = {
+    # LexRank is pure-Python CPU work, so it gets real processes
+    "summary": BoundedExecutor(
+        "summary", functools.partial(_process_pool, Config.SUMMARY_WORKERS), Config.SUMMARY_QUEUE_LIMIT,
+        copy_context=False
+    ),
+    # One inference worker per model; torch parallelises inside each call
+    "sentiment": BoundedExecutor(
+        "sentiment", functools.partial(ThreadPoolExecutor, 1, "sentiment"), Config.MODEL_QUEUE_LIMIT
+    ),
+    "embedding": BoundedExecutor(
+        "embedding", functools.partial(ThreadPoolExecutor, 1, "embedding"), Config.MODEL_QUEUE_LIMIT
+    ),
+    # Blocking network calls without an async client (gTTS)
+    "io": BoundedExecutor(
+        "io", functools.partial(ThreadPoolExecutor, Config.IO_WORKERS, "io"), Config.IO_QUEUE_LIMIT
+    ),
+}
+
+
+async def run_in_executor(name, fn, *args, **kwargs):
+    """
+    Run fn on the named executor and await its result without blocking the event loop.
+    Raises ExecutorSaturated if the executor has no free slot.
+    """
+    future = EXECUTORS[name].submit(fn, *args, **kwargs)
+    return await asyncio.wrap_future(future)
+
+
+async def map_in_executor(name, batch_fn, items, chunks, **kwargs):
+    """
+    Split items into at most `chunks` contiguous batches, run batch_fn on each batch in the named
+    executor concurrently, and return the concatenated results in input order.
+    """
+    items = list(items)
+    if not items:
+        return []
+    size = -(-len(items) // max(1, chunks))
+    batches = [items[i:i + size] for i in range(0, len(items), size)]
+    results = await asyncio.gather(*(run_in_executor(name, batch_fn, batch, **kwargs) for batch in batches))
+    return [result for batch_results in results for result in batch_results]
+
+
+def shutdown_executors():
+    for executor in EXECUTORS.values():
+        executor.shutdown()
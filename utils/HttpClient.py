@@ -0,0 +1,292 @@
+import asyncio
+import codecs
+import importlib.util
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import Config
+
+'''
+Shared HTTP clients for the scraper.
+Both clients pool connections per host, retry 429/5xx and connection errors with jittered exponential
+backoff, cap response sizes, can make conditional requests (ETag / Last-Modified) and can stream a
+response into a consumer that stops the download early.
+'''
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_VALIDATORS = 512
+CHUNK_SIZE = 16 * 1024
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class FetchResult:
+    """
+    The parts of a response the scraper uses, detached from the underlying connection.
+    """
+
+    def __init__(self, url, status_code, content, headers, not_modified=False, truncated=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.not_modified = not_modified
+        self.truncated = truncated
+
+    @property
+    def text(self):
+        return self.content.decode(_charset(self.headers), errors="replace")
+
+
+def _charset(headers):
+    content_type = headers.get("content-type", "")
+    for part in content_type.split(";")[1:]:
+        name, _, value = part.strip().partition("=")
+        if name.lower() == "charset" and value:
+            try:
+                return codecs.lookup(value.strip('"')).name
+            except LookupError:
+                break
+    return "utf-8"
+
+
+def _backoff_delay(attempt, retry_after=None):
+    """
+    Full-jitter exponential backoff, or the server's Retry-After (in seconds) when it sends one.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), Config.HTTP_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(Config.HTTP_BACKOFF_MAX, Config.HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+class _Validators:
+    """
+    Bounded store of ETag / Last-Modified validators and the bodies they validate.
+    """
+
+    def __init__(self, max_items=MAX_VALIDATORS):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def request_headers(self, url):
+        with self._lock:
+            entry = self._items.get(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def remember(self, url, headers, content):
+        etag, last_modified = headers.get("etag"), headers.get("last-modified")
+        if not (etag or last_modified):
+            return
+        with self._lock:
+            self._items[url] = {"etag": etag, "last_modified": last_modified, "content": content,
+                                "headers": {key.lower(): value for key, value in headers.items()}}
+            self._items.move_to_end(url)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def cached(self, url):
+        with self._lock:
+            return self._items.get(url)
+
+
+class _StreamReader:
+    """
+    Accumulates body chunks up to a byte cap, optionally decoding them into a text consumer.
+    The consumer returns True once it has read enough.
+    """
+
+    def __init__(self, headers, max_bytes, consumer=None):
+        self.max_bytes = max_bytes
+        self.consumer = consumer
+        self.chunks = []
+        self.size = 0
+        self.truncated = False
+        self.stopped = False
+        self.consumed = False  # the consumer has been given text
+        self._decoder = codecs.getincrementaldecoder(_charset(headers))(errors="replace")
+
+    def feed(self, chunk):
+        """
+        Returns True when reading should stop.
+        """
+        if self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.consumer is not None:
+            self.consumed = True
+            if self.consumer(self._decoder.decode(chunk)):
+                self.stopped = True
+        return self.truncated or self.stopped
+
+    @property
+    def content(self):
+        return b"".join(self.chunks)
+
+
+class HttpClient:
+    """
+    Blocking client on a pooled requests.Session.
+    """
+
+    def __init__(self, timeout=Config.HTTP_TIMEOUT, retries=Config.HTTP_RETRIES,
+                 pool_hosts=Config.HTTP_POOL_HOSTS, pool_size=Config.HTTP_POOL_SIZE):
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._validators = _Validators()
+
+    def _send(self, url, headers):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(_backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                time.sleep(_backoff_delay(attempt, retry_after))
+                continue
+            return response
+
+    def get(self, url, headers=None, conditional=False, max_bytes=Config.HTTP_MAX_PAGE_BYTES, consumer=None):
+        """
+        GET `url` with retries. With conditional=True, previously seen validators are sent and a 304
+        is answered from the stored body (reported as a 200 with not_modified=True). With a consumer,
+        decoded text is streamed into it and the download stops as soon as it returns True.
+        """
+        headers = dict(headers or {})
+        if conditional:
+            headers.update(self._validators.request_headers(url))
+
+        response = self._send(url, headers)
+        try:
+            if response.status_code == 304 and conditional:
+                stored = self._validators.cached(url)
+                if stored is not None:
+                    return FetchResult(url, 200, stored["content"], stored["headers"], not_modified=True)
+
+            reader = _StreamReader(response.headers, max_bytes, consumer)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk and reader.feed(chunk):
+                    break
+        finally:
+            response.close()
+
+        result = FetchResult(url, response.status_code, reader.content, response.headers,
+                             truncated=reader.truncated or reader.stopped)
+        if conditional and response.status_code == 200 and not result.truncated:
+            self._validators.remember(url, response.headers, result.content)
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHttpClient:
+    """
+    Non-blocking client on a pooled httpx.AsyncClient, using HTTP/2 when the h2 package is installed.
+    """
+
+    def __init__(self, timeout=Config.HTTP_TIMEOUT, retries=Config.HTTP_RETRIES,
+                 max_connections=Config.HTTP_MAX_CONNECTIONS, pool_size=Config.HTTP_POOL_SIZE, transport=None):
+        self.retries = retries
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=pool_size),
+            http2=HTTP2_AVAILABLE,
+            follow_redirects=True,
+            transport=transport
+        )
+        self._validators = _Validators()
+
+    async def get(self, url, headers=None, conditional=False, max_bytes=Config.HTTP_MAX_PAGE_BYTES, consumer=None):
+        """
+        Async counterpart of HttpClient.get with the same retry, conditional and streaming behaviour.
+        A body that fails after part of it has reached the consumer is not retried, as the consumer
+        cannot take the same text twice.
+        """
+        headers = dict(headers or {})
+        if conditional:
+            headers.update(self._validators.request_headers(url))
+
+        for attempt in range(self.retries + 1):
+            reader = None
+            try:
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                        retry_after = response.headers.get("Retry-After")
+                    else:
+                        if response.status_code == 304 and conditional:
+                            stored = self._validators.cached(url)
+                            if stored is not None:
+                                return FetchResult(url, 200, stored["content"], stored["headers"], not_modified=True)
+
+                        reader = _StreamReader(response.headers, max_bytes, consumer)
+                        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                            if chunk and reader.feed(chunk):
+                                break
+
+                        result = FetchResult(url, response.status_code, reader.content, response.headers,
+                                             truncated=reader.truncated or reader.stopped)
+                        if conditional and response.status_code == 200 and not result.truncated:
+                            self._validators.remember(url, response.headers, result.content)
+                        return result
+            except (httpx.ConnectError, httpx.TimeoutException, httpx.RemoteProtocolError):
+                if attempt == self.retries or (reader is not None and reader.consumed):
+                    raise
+                retry_after = None
+
+            await asyncio.sleep(_backoff_delay(attempt, retry_after))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """
+    The shared blocking client, created on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def set_http_client(client):
+    """
+    Replace the shared blocking client, e.g. with one pointed at a local stand-in server.
+    """
+    global _client
+    with _client_lock:
+        _client = client
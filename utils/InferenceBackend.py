@@ -0,0 +1,246 @@
+import fcntl
+import importlib.util
+import logging
+import os
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from utils import Config
+
+'''
+CPU inference backends for the transformer models.
+  - "torch": the fp32 PyTorch model as loaded
+  - "torch-int8": PyTorch with Linear layers dynamically quantized to int8
+  - "onnx": the model exported once to ONNX and run with ONNX Runtime
+Thread counts follow the container's CPU quota rather than the host's core count.
+'''
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+ONNX_OPSET = 17
+
+ONNX_AVAILABLE = importlib.util.find_spec("onnxruntime") is not None
+
+
+# ------------------ THREADS ------------------ #
+
+def cpu_quota():
+    """
+    CPUs available to this process: the cgroup CPU quota (v2 cpu.max or v1 cfs_quota_us) when one is
+    set, bounded by the CPU affinity mask. Never less than 1.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        available = min(available, int(quota) or 1)
+    return max(1, available)
+
+
+def inference_threads():
+    """
+    Threads per inference call: NEWS_INFERENCE_THREADS, or this process's share of the CPU quota when
+    Config.WORKERS server processes run side by side.
+    """
+    return Config.INFERENCE_THREADS or max(1, cpu_quota() // Config.WORKERS)
+
+
+_threads_configured = False
+
+
+def configure_torch_threads(threads=None):
+    """
+    Size PyTorch's intra-op pool to inference_threads(), once per process. An explicit `threads` always
+    applies (e.g. a single thread while a server master loads models, then a share per forked worker).
+    """
+    global _threads_configured
+    if threads is not None or not _threads_configured:
+        torch.set_num_threads(threads or inference_threads())
+        _threads_configured = True
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if backend == "onnx" and not ONNX_AVAILABLE:
+        raise RuntimeError("The 'onnx' inference backend needs onnxruntime (pip install onnxruntime)")
+    return backend
+
+
+def cache_model_name(model_name, backend):
+    """
+    Result-cache model key: results of non-default backends are cached separately from fp32 ones.
+    """
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+# ------------------ BACKENDS ------------------ #
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of every Linear layer (weights int8, activations quantized on the fly).
+    """
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _onnx_path(name):
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+    return os.path.join(Config.ONNX_DIR, f"{safe}.onnx")
+
+
+def _export_onnx(model, name, output_names, path):
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    dynamic = {0: "batch", 1: "sequence"}
+    logger.info("Exporting %s to ONNX at %s", name, path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with torch.inference_mode():
+            torch.onnx.export(
+                model,
+                (dummy, dummy),
+                tmp_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=list(output_names),
+                dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic,
+                              **{output: {0: "batch"} for output in output_names}},
+                opset_version=ONNX_OPSET
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def onnx_session(model, name, output_names):
+    """
+    ONNX Runtime session for a Hugging Face model taking (input_ids, attention_mask).
+    The model is exported to Config.ONNX_DIR on first use and the exported graph reused afterwards.
+    """
+    import onnxruntime
+
+    path = _onnx_path(name)
+    if not os.path.exists(path):
+        os.makedirs(Config.ONNX_DIR, exist_ok=True)
+        # Workers starting together export one at a time; the ones that waited find the finished graph
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(path):
+                _export_onnx(model, name, output_names, path)
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = inference_threads()
+    options.inter_op_num_threads = 1
+    return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+class OnnxSequenceClassifier:
+    """
+    Drop-in for a Hugging Face sequence classifier in inference: called with input_ids and
+    attention_mask tensors, returns an object with `.logits`, and keeps the model's `config`.
+    """
+
+    def __init__(self, model, name):
+        model.config.return_dict = False
+        self.config = model.config
+        self.session = onnx_session(model, name, ["logits"])
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        logits, = self.session.run(["logits"], {
+            "input_ids": input_ids.numpy().astype(np.int64),
+            "attention_mask": attention_mask.numpy().astype(np.int64)
+        })
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+def build_sequence_classifier(model, name, backend):
+    """
+    The classifier to run for `backend`, from a loaded fp32 model in eval mode.
+    """
+    configure_torch_threads()
+    if backend == "torch-int8":
+        return quantize_int8(model)
+    if backend == "onnx":
+        return OnnxSequenceClassifier(model, f"{name}-classifier")
+    return model
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime version of a SentenceTransformer made of Transformer -> mean Pooling [-> Normalize],
+    exposing the `encode` and `get_sentence_embedding_dimension` calls used by the pipeline.
+    """
+
+    def __init__(self, sentence_model, name):
+        transformer, pooling = sentence_model[0], sentence_model[1]
+        if not getattr(pooling, "pooling_mode_mean_tokens", False):
+            raise ValueError(f"{name}: only mean-pooled sentence transformers can run on the onnx backend")
+
+        self.tokenizer = transformer.tokenizer
+        self.max_length = transformer.max_seq_length
+        self.normalize = any(type(module).__name__ == "Normalize" for module in sentence_model)
+        self.dimension = sentence_model.get_sentence_embedding_dimension()
+
+        transformer.auto_model.config.return_dict = False
+        self.session = onnx_session(transformer.auto_model, f"{name}-encoder", ["last_hidden_state"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        texts = list(texts)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            batch = self.tokenizer(
+                [texts[i] for i in batch_idx], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np"
+            )
+            mask = batch["attention_mask"].astype(np.int64)
+            hidden, = self.session.run(["last_hidden_state"], {
+                "input_ids": batch["input_ids"].astype(np.int64),
+                "attention_mask": mask
+            })
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            if self.normalize:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            embeddings[batch_idx] = pooled
+        return embeddings
+
+
+def build_sentence_encoder(sentence_model, name, backend):
+    """
+    The sentence encoder to run for `backend`, from a loaded fp32 SentenceTransformer.
+    """
+    configure_torch_threads()
+    if backend == "torch-int8":
+        return quantize_int8(sentence_model)
+    if backend == "onnx":
+        return OnnxSentenceEncoder(sentence_model, name)
+    return sentence_model
@@ -0,0 +1,327 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import Config
+from utils.Executors import ExecutorSaturated
+from utils.Metrics import JOB_SUBMISSIONS, request_timings
+
+'''
+Background jobs for long-running pipelines such as /analyze.
+Jobs are keyed by what they compute: a submission whose key matches a queued or running job joins it
+(single-flight), and a job that finished successfully less than `result_ttl` seconds ago is served
+as is. New jobs wait in a bounded priority queue drained by a fixed number of worker tasks.
+Each job's state is also recorded in SQLite, so that when several server processes run, a poll that
+reaches another process than the one running the job is still answered. Single-flight is per
+process: processes do not join each other's jobs (their index refreshes are coalesced instead).
+'''
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # a client is waiting on the response
+PRIORITY_BACKGROUND = 1  # the client polls /jobs/{id}
+
+# Records of jobs that never finished (their process exited) are dropped after this long
+STALE_RECORD_SECONDS = 24 * 3600
+
+
+class Job:
+    """
+    One unit of work and its state: queued -> running -> done | failed.
+    `progress` is updated by the job while it runs and reported to pollers.
+    """
+
+    def __init__(self, key, run, priority, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.priority = priority
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.timings = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._run = run
+        self._on_change = on_change
+        self._done = asyncio.Event()
+
+    @classmethod
+    def restore(cls, state, timings=None):
+        """
+        Read-only copy of a job from its recorded state (see describe()).
+        """
+        job = cls(None, None, None)
+        job.id = state["job_id"]
+        for field in ("status", "progress", "created", "started", "finished"):
+            setattr(job, field, state[field])
+        job.result = state.get("result")
+        job.error = state.get("error")
+        job.timings = timings
+        return job
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def update(self, **progress):
+        self.progress.update(progress)
+        if self._on_change is not None:
+            self._on_change(self)
+
+    async def wait(self):
+        await self._done.wait()
+        return self
+
+    def describe(self):
+        """
+        JSON-friendly status, with the result or error once the job has finished.
+        """
+        state = {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+        if self.status == "done":
+            state["result"] = self.result
+        elif self.status == "failed":
+            state["error"] = self.error
+        return state
+
+
+class JobRecords:
+    """
+    Latest state of every job in a SQLite table shared by the server processes.
+    Updates of running jobs are written by a background thread, in order, so the event loop does not
+    wait on SQLite for every progress report.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def _db(self):
+        # Connected on first use, so each forked server worker has its own connection
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, timings TEXT, finished REAL, updated REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def save(self, job):
+        self._save(job.id, job.describe(), job.timings, job.finished)
+
+    def save_later(self, job, expire_before=None):
+        """
+        save() on the writer thread, followed by expire(expire_before) when given.
+        """
+        state = job.describe()
+        state["progress"] = dict(job.progress)
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(1, "job-records")
+        self._writer.submit(self._save_logged, job.id, state, job.timings, job.finished, expire_before)
+
+    def _save_logged(self, job_id, state, timings, finished, expire_before):
+        try:
+            self._save(job_id, state, timings, finished)
+            if expire_before is not None:
+                self.expire(expire_before)
+        except sqlite3.Error as e:
+            logger.warning("Could not record job %s: %s", job_id, e)
+
+    def _save(self, job_id, state, timings, finished):
+        state, timings = json.dumps(state, default=str), json.dumps(timings)
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, state, timings, finished, updated) VALUES (?, ?, ?, ?, ?)",
+                (job_id, state, timings, finished, time.time())
+            )
+            db.commit()
+
+    def load(self, job_id):
+        with self._lock:
+            row = self._db().execute("SELECT state, timings FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return Job.restore(json.loads(row[0]), json.loads(row[1]))
+
+    def expire(self, finished_before):
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "DELETE FROM jobs WHERE finished < ? OR updated < ?",
+                (finished_before, time.time() - STALE_RECORD_SECONDS)
+            )
+            db.commit()
+
+    def flush(self):
+        """
+        Wait for the pending writes.
+        """
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+
+class JobQueue:
+    """
+    Single-flight job runner with a bounded priority queue and a fixed pool of asyncio workers.
+    start() must be called from the event loop that will run the jobs.
+    """
+
+    def __init__(self, workers=Config.JOB_WORKERS, max_queued=Config.JOB_QUEUE_LIMIT,
+                 result_ttl=Config.JOB_RESULT_TTL_SECONDS, records_path=Config.JOB_RECORDS_PATH):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.records = JobRecords(records_path) if records_path else None
+        self._jobs = {}
+        self._by_key = {}
+        self._order = itertools.count()
+        self._queue = None
+        self._queued = 0  # jobs waiting to run; a promoted job has two queue entries but counts once
+        self._tasks = []
+
+    def start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._jobs.values():
+            if job.active:
+                self._finish(job, error={"status_code": 503, "detail": "The server is shutting down"})
+        self._queued = 0
+        if self.records is not None:
+            self.records.flush()
+
+    def submit(self, key, run, priority=PRIORITY_BACKGROUND):
+        """
+        Job computing `key`: the queued, running or recently finished one if there is one, otherwise
+        a new job that will await `run(job)`. Returns (job, joined) where `joined` tells whether an
+        existing job was reused. Raises ExecutorSaturated when the queue is full.
+        """
+        self._expire()
+        job = self._by_key.get(key)
+        if job is not None and (job.active or job.status == "done"):
+            JOB_SUBMISSIONS.labels("coalesced" if job.active else "cached").inc()
+            if job.status == "queued" and priority < job.priority:
+                # An interactive follower promotes a queued background job
+                job.priority = priority
+                self._queue.put_nowait((priority, next(self._order), job))
+            return job, True
+
+        if self._queued >= self.max_queued:
+            JOB_SUBMISSIONS.labels("rejected").inc()
+            raise ExecutorSaturated("Too many analyses are queued, please retry shortly.")
+
+        job = Job(key, run, priority, on_change=self._record)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self._queue.put_nowait((priority, next(self._order), job))
+        self._queued += 1
+        # Written before the job id is handed out, so that any server process can answer its polls
+        self._record(job, now=True)
+        JOB_SUBMISSIONS.labels("queued").inc()
+        return job, False
+
+    def get(self, job_id):
+        """
+        The job with this id, or None. Jobs of other server processes are read from the records.
+        """
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None and self.records is not None:
+            try:
+                job = self.records.load(job_id)
+            except sqlite3.Error as e:
+                logger.warning("Could not read job %s: %s", job_id, e)
+        return job
+
+    def stats(self):
+        statuses = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"workers": self.workers, "queued": self._queued, "jobs": statuses}
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            # A promoted job is queued twice; only its first dequeue runs it
+            if job.status != "queued":
+                continue
+            self._queued -= 1
+            job.status = "running"
+            job.started = time.time()
+            self._record(job)
+            try:
+                with request_timings() as timings:
+                    result = await job._run(job)
+            except asyncio.CancelledError:
+                self._finish(job, error={"status_code": 503, "detail": "The job was cancelled"})
+                raise
+            except ExecutorSaturated as e:
+                self._finish(job, error={"status_code": 429, "detail": str(e)})
+            except Exception as e:
+                logger.exception("Job %s failed", job.id, extra={"job_id": job.id})
+                self._finish(job, error={"status_code": 500, "detail": str(e)})
+            else:
+                job.timings = timings
+                self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        job.result = result
+        job.error = error
+        job.status = "failed" if error is not None else "done"
+        job.finished = time.time()
+        job._done.set()
+        self._record(job)
+
+    def _record(self, job, now=False):
+        if self.records is None:
+            return
+        if not now:
+            expire_before = time.time() - self.result_ttl if job.finished is not None else None
+            self.records.save_later(job, expire_before)
+            return
+        try:
+            self.records.save(job)
+        except sqlite3.Error as e:
+            logger.warning("Could not record job %s: %s", job.id, e)
+
+    def _expire(self):
+        """
+        Forget finished jobs older than the result TTL.
+        """
+        cutoff = time.time() - self.result_ttl
+        expired = [job for job in self._jobs.values() if job.finished is not None and job.finished < cutoff]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+
+jobs = JobQueue()
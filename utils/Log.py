@@ -0,0 +1,63 @@
+import json
+import logging
+import sys
+
+from utils import Config
+
+'''
+Logging setup. Modules log through logging.getLogger(__name__) with lazy %-style arguments and
+structured fields passed as `extra`; this module decides how records are rendered.
+  - "text": timestamp, level, logger and message, followed by the extra fields as key=value
+  - "json": one JSON object per line, extra fields included
+'''
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extra_fields(record)
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level=Config.LOG_LEVEL, fmt=Config.LOG_FORMAT):
+    """
+    Send log records to stderr in the configured format. Handlers installed by someone else
+    (e.g. a test runner) are left alone.
+    """
+    root = logging.getLogger()
+    root.setLevel(level)
+    # httpx logs every request at INFO; page fetches are covered by the "fetch"/"extract" spans instead
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    root.addHandler(handler)
@@ -0,0 +1,110 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+'''
+Pipeline instrumentation.
+`span(stage)` times a pipeline stage into a Prometheus histogram, counts its failures, and adds its
+duration to the current request's timing breakdown when one is being collected (see request_timings).
+Counters and histograms are exposed in the Prometheus text format by metrics_payload().
+'''
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("fetch", "extract", "dedup", "summarize", "sentiment", "embed", "topics", "compare", "tts")
+
+STAGE_SECONDS = Histogram(
+    "news_stage_seconds", "Time spent in each pipeline stage", ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+STAGE_FAILURES = Counter("news_stage_failures_total", "Failures in each pipeline stage", ["stage"])
+ARTICLES_PROCESSED = Counter("news_articles_processed_total", "Articles summarized and scored")
+ARTICLES_COLLAPSED = Counter(
+    "news_articles_collapsed_total", "Syndicated copies collapsed by deduplication", ["check"]
+)
+CACHE_LOOKUPS = Counter("news_cache_lookups_total", "Result cache lookups", ["namespace", "result"])
+MODEL_BATCH_SIZE = Histogram(
+    "news_model_batch_size", "Items per model batch", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+JOB_SUBMISSIONS = Counter(
+    "news_job_submissions_total", "Job submissions by outcome (queued, coalesced, cached, rejected)", ["outcome"]
+)
+EXECUTOR_REJECTIONS = Counter("news_executor_rejections_total", "Tasks rejected by a saturated executor", ["executor"])
+REQUEST_SECONDS = Histogram(
+    "news_request_seconds", "API request latency until the response starts", ["route", "method", "status"]
+)
+
+_request_timings = contextvars.ContextVar("news_request_timings", default=None)
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a pipeline stage. Exceptions are counted as failures of the stage and re-raised.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_FAILURES.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            seconds, calls = timings.get(stage, (0.0, 0))
+            timings[stage] = (seconds + elapsed, calls + 1)
+        logger.debug("stage %s took %.4fs", stage, elapsed, extra={"stage": stage, "seconds": round(elapsed, 6)})
+
+
+def record_failure(stage):
+    """
+    Count a failure that was handled without raising (e.g. a page that could not be extracted).
+    """
+    STAGE_FAILURES.labels(stage).inc()
+
+
+def observe_batch(model, size):
+    MODEL_BATCH_SIZE.labels(model).observe(size)
+
+
+@contextmanager
+def request_timings():
+    """
+    Collect the stage timings of everything run in this context (including tasks and executor threads
+    started from it) and yield a dict that is filled with the breakdown when the block exits.
+    Stages that run concurrently, such as page extraction, report their summed time.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    started = time.perf_counter()
+    breakdown = {}
+    try:
+        yield breakdown
+    finally:
+        _request_timings.reset(token)
+        breakdown.update({
+            stage: {"ms": round(seconds * 1000, 2), "calls": calls}
+            for stage, (seconds, calls) in timings.items()
+        })
+        breakdown["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def metrics_payload():
+    """
+    (body, content type) of the Prometheus exposition. With PROMETHEUS_MULTIPROC_DIR set, the
+    metrics of every worker process are merged.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
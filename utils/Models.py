@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+
+'''
+Lazy, thread-safe model loading.
+Each model module registers a loader here; nothing is loaded until the model is first used
+or warm_up() is called, so importing the API stays fast. A pre-forking server calls preload() in its
+master process instead, so that every worker shares one copy of the weights.
+'''
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class LazyModel:
+    """
+    Holds a model that is loaded on first access. Concurrent callers wait for a single load.
+    """
+
+    def __init__(self, name, loader, fork_safe=True):
+        self.name = name
+        self.fork_safe = fork_safe
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.state = "pending"
+        self.error = None
+        self.load_seconds = None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+
+        with self._lock:
+            if not self._loaded:
+                self.state = "loading"
+                started = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self._loaded = True
+                self.state = "loaded"
+                self.error = None
+                logger.info("Loaded model '%s' in %ss", self.name, self.load_seconds,
+                            extra={"model": self.name, "seconds": self.load_seconds})
+        return self._value
+
+
+    def set(self, value):
+        """
+        Install an already-built model (e.g. a stub for benchmarks) instead of loading one.
+        """
+        with self._lock:
+            self._value = value
+            self._loaded = True
+            self.state = "loaded"
+            self.error = None
+
+
+def register(name, loader, fork_safe=True):
+    """
+    Register a loader under `name` and return its LazyModel accessor. Models that own threads (e.g. an
+    ONNX Runtime session) are not `fork_safe`: they are never loaded before a fork.
+    """
+    lazy = LazyModel(name, loader, fork_safe)
+    _registry[name] = lazy
+    return lazy
+
+
+def warm_up(names=None):
+    """
+    Load the given (default: all registered) models now, in the calling thread.
+    Failures are recorded on the model and reported by readiness() rather than raised.
+    """
+    for name, lazy in list(_registry.items()):
+        if names is not None and name not in names:
+            continue
+        try:
+            lazy.get()
+        except Exception as e:
+            logger.error("Warm-up of model '%s' failed: %s", name, e)
+
+
+def preload():
+    """
+    Load every fork-safe model in the calling process, for a server master about to fork its workers.
+    Forked workers then share the weights copy-on-write instead of each loading their own copy; the
+    other models load in each worker as usual.
+    """
+    warm_up([name for name, lazy in _registry.items() if lazy.fork_safe])
+
+
+def start_background_warm_up(names=None):
+    thread = threading.Thread(target=warm_up, args=(names,), name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness():
+    models = {}
+    for name, lazy in _registry.items():
+        models[name] = {"state": lazy.state, "load_seconds": lazy.load_seconds}
+        if lazy.error:
+            models[name]["error"] = lazy.error
+    return {
+        "ready": all(lazy.loaded for lazy in _registry.values()),
+        "models": models
+    }
@@ -0,0 +1,532 @@
+import asyncio
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+
+from utils import Config
+from utils.Article import Article
+from utils.Cache import content_hash
+from utils.ComparitiveAnalysis import encode_texts
+from utils.Dedup import ArticleDeduplicator, canonicalize_url
+from utils.Executors import run_in_executor
+from utils.NewsScrapper import (
+    FEED_MAX_ITEMS, collect_article_texts_async, fetch_bing_news_links_async, get_news_articles_async,
+    get_news_articles_batch_async, score_articles_async, stream_news_articles_async, stream_processed_articles_async
+)
+from utils.VectorStore import vector_store
+
+'''
+Persistent per-company index of processed articles.
+Each article is stored once per company under its canonical URL, with its text, summary, sentiment
+and summary embedding, so repeated analyses are served from the index and a refresh only
+processes the feed items that are not there yet. Watched companies are refreshed in the background.
+Newly indexed articles are also added to the vector store for similar-coverage search.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Stored articles compared against new feed items when collapsing syndicated copies
+DEDUP_WINDOW = 200
+# How often a process waiting for another one's refresh of a company checks whether it has finished
+REFRESH_LOCK_POLL_SECONDS = 0.2
+
+# Stored columns that map onto Article fields
+_ARTICLE_COLUMNS = (
+    "url", "title", "summary", "text", "sentiment", "sentiment_score", "embedding",
+    "publish_date", "syndication_count"
+)
+
+
+def _published_timestamp(publish_date):
+    try:
+        return parsedate_to_datetime(publish_date).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class NewsIndex:
+    """
+    SQLite store of processed articles keyed by (company, canonical URL), plus the watchlist and the
+    time each company was last refreshed.
+    """
+
+    def __init__(self, path=Config.INDEX_PATH, max_articles=Config.INDEX_MAX_ARTICLES, enabled=Config.INDEX_ENABLED):
+        self.path = path
+        self.max_articles = max_articles
+        self.enabled = enabled
+        self._lock = threading.RLock()
+        self._conn = None
+
+    # ------------------ STORAGE ------------------ #
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                "company TEXT NOT NULL, canonical_url TEXT NOT NULL, url TEXT NOT NULL, title TEXT NOT NULL, "
+                "summary TEXT, text TEXT, sentiment TEXT, sentiment_score REAL, embedding BLOB, "
+                "publish_date TEXT, published REAL, syndication_count INTEGER NOT NULL DEFAULT 1, "
+                "indexed REAL NOT NULL, PRIMARY KEY (company, canonical_url))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS articles_recent ON articles(company, published)")
+            # URLs of syndicated copies that were collapsed onto a stored article, so they are not counted again
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen_urls ("
+                "company TEXT NOT NULL, canonical_url TEXT NOT NULL, PRIMARY KEY (company, canonical_url))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS companies ("
+                "company TEXT PRIMARY KEY, name TEXT NOT NULL, watched INTEGER NOT NULL DEFAULT 0, "
+                "refreshed REAL NOT NULL DEFAULT 0)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def company_key(company):
+        return " ".join(company.lower().split())
+
+    def _ensure_company(self, db, company):
+        db.execute(
+            "INSERT OR IGNORE INTO companies (company, name) VALUES (?, ?)",
+            (self.company_key(company), company.strip())
+        )
+
+    # ------------------ ARTICLES ------------------ #
+
+    def known_urls(self, company):
+        """
+        Canonical URLs of every stored article and every collapsed copy seen for a company.
+        """
+        key = self.company_key(company)
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT canonical_url FROM articles WHERE company = ? "
+                "UNION SELECT canonical_url FROM seen_urls WHERE company = ?",
+                (key, key)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_seen(self, company, urls):
+        key = self.company_key(company)
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR IGNORE INTO seen_urls (company, canonical_url) VALUES (?, ?)",
+                [(key, canonicalize_url(url)) for url in urls]
+            )
+            db.commit()
+
+    def articles(self, company, limit=None, with_embeddings=False, with_text=True):
+        """
+        Stored articles for a company as Article records, most recently published first.
+        Embeddings and article bodies are only read when asked for.
+        """
+        columns = [
+            column for column in _ARTICLE_COLUMNS
+            if (with_embeddings or column != "embedding") and (with_text or column != "text")
+        ]
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT {', '.join(columns)} FROM articles WHERE company = ? "
+                "ORDER BY COALESCE(published, indexed) DESC LIMIT ?",
+                (self.company_key(company), -1 if limit is None else limit)
+            ).fetchall()
+
+        articles = []
+        for row in rows:
+            fields = dict(zip(columns, row))
+            if fields.get('embedding') is not None:
+                fields['embedding'] = np.frombuffer(fields['embedding'], dtype=np.float32)
+            articles.append(Article(**fields))
+        return articles
+
+    def upsert(self, company, articles):
+        """
+        Insert or replace processed articles, then trim the company to its `max_articles` newest.
+        """
+        now = time.time()
+        key = self.company_key(company)
+        rows = []
+        for a in articles:
+            embedding = a.get('embedding')
+            rows.append((
+                key, canonicalize_url(a['url']), a['url'], a['title'], a.get('summary'), a.get('text'),
+                a.get('sentiment'), a.get('sentiment_score'),
+                None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes(),
+                a.get('publish_date'), _published_timestamp(a.get('publish_date')),
+                a.get('syndication_count', 1), now
+            ))
+
+        with self._lock:
+            db = self._db()
+            self._ensure_company(db, company)
+            db.executemany(
+                "INSERT OR REPLACE INTO articles (company, canonical_url, url, title, summary, text, sentiment, "
+                "sentiment_score, embedding, publish_date, published, syndication_count, indexed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            db.execute(
+                "DELETE FROM articles WHERE company = ? AND canonical_url NOT IN ("
+                "SELECT canonical_url FROM articles WHERE company = ? "
+                "ORDER BY COALESCE(published, indexed) DESC LIMIT ?)",
+                (key, key, self.max_articles)
+            )
+            db.commit()
+
+    # ------------------ COMPANIES ------------------ #
+
+    def refreshed_at(self, company):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT refreshed FROM companies WHERE company = ?", (self.company_key(company),)
+            ).fetchone()
+        return row[0] if row else 0.0
+
+    def mark_refreshed(self, company, when=None):
+        with self._lock:
+            db = self._db()
+            self._ensure_company(db, company)
+            db.execute(
+                "UPDATE companies SET refreshed = ? WHERE company = ?",
+                (time.time() if when is None else when, self.company_key(company))
+            )
+            db.commit()
+
+    def watch(self, company):
+        with self._lock:
+            db = self._db()
+            self._ensure_company(db, company)
+            db.execute("UPDATE companies SET watched = 1 WHERE company = ?", (self.company_key(company),))
+            db.commit()
+
+    def unwatch(self, company):
+        with self._lock:
+            db = self._db()
+            cursor = db.execute("UPDATE companies SET watched = 0 WHERE company = ?", (self.company_key(company),))
+            db.commit()
+        return cursor.rowcount > 0
+
+    def watched(self):
+        with self._lock:
+            rows = self._db().execute("SELECT name FROM companies WHERE watched = 1 ORDER BY name").fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        with self._lock:
+            db = self._db()
+            articles = db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            rows = db.execute(
+                "SELECT c.name, c.watched, c.refreshed, COUNT(a.canonical_url) FROM companies c "
+                "LEFT JOIN articles a ON a.company = c.company GROUP BY c.company ORDER BY c.name"
+            ).fetchall()
+        return {
+            "articles": articles,
+            "companies": [
+                {"company": name, "watched": bool(watched), "refreshed": refreshed, "articles": count}
+                for name, watched, refreshed, count in rows
+            ]
+        }
+
+
+# Shared index used by the API server
+news_index = NewsIndex()
+
+_refresh_locks = {}
+
+
+async def refresh_companies_async(companies, client, index=news_index, limit=Config.INDEX_REFRESH_LIMIT,
+                                  vectors=vector_store, errors=None):
+    """
+    Pull each company's feed and process only the items that are not in the index yet (up to `limit`
+    per company). Feeds and pages are fetched concurrently and the new articles of every company share
+    one summary, sentiment and embedding pass. New copies of stored stories raise the stored article's
+    syndication count instead of being processed.
+    Concurrent refreshes of the same company share one run, also across server processes: a process
+    waits for another one's refresh of a company and then skips it. Returns {company: newly indexed
+    articles}; companies refreshed by another process have none.
+    A company whose feed cannot be fetched is not marked as refreshed; the others are still indexed.
+    Failures are put in `errors` ({company: exception}) when it is given, otherwise the first one is
+    raised afterwards.
+    """
+    refreshing, waiting = {}, []
+    for company in {index.company_key(company): company for company in companies}.values():
+        lock = _refresh_locks.setdefault(index.company_key(company), asyncio.Lock())
+        if lock.locked():
+            # Another request is already refreshing this company; wait for it rather than fetching again
+            waiting.append(lock)
+        else:
+            refreshing[company] = lock
+
+    started = time.time()
+    for lock in refreshing.values():
+        await lock.acquire()
+    claims = []
+    try:
+        # Sorted, so that processes claiming overlapping sets of companies cannot deadlock
+        for company in sorted(refreshing, key=index.company_key):
+            claims.append(await _claim_refresh(index, company))
+        fresh = await run_in_executor("io", _refreshed_since, index, list(refreshing), started)
+        pending = [company for company in refreshing if company not in fresh]
+
+        # One index read for every company, rather than one io task per company
+        state = await run_in_executor("io", _refresh_state, index, pending)
+
+        async def collect(company):
+            known, stored = state[company]
+            fetched = await fetch_bing_news_links_async(company, client, limit=FEED_MAX_ITEMS, raise_errors=True)
+            fetched = [a for a in fetched if canonicalize_url(a['url']) not in known]
+
+            counts = [a['syndication_count'] for a in stored]
+            dedup = ArticleDeduplicator()
+            dedup.seed(stored)
+
+            articles = await collect_article_texts_async(
+                dedup.filter(fetched, "url", "title"), client, dedup, limit=limit
+            )
+            syndicated = [a for a, count in zip(stored, counts) if a['syndication_count'] != count]
+            return articles, syndicated, dedup.collapsed
+
+        results = await asyncio.gather(*(collect(c) for c in pending), return_exceptions=True)
+        failures = {c: result for c, result in zip(pending, results) if isinstance(result, BaseException)}
+        collected = {c: result for c, result in zip(pending, results) if c not in failures}
+
+        pooled = [article for articles, _, _ in collected.values() for article in articles]
+        if pooled:
+            await score_articles_async(pooled)
+            embeddings = await run_in_executor("embedding", encode_texts, [a['summary'] for a in pooled])
+            for article, embedding in zip(pooled, embeddings):
+                article['embedding'] = embedding
+
+        for company, (articles, syndicated, collapsed) in collected.items():
+            await run_in_executor("io", _store, index, company, articles + syndicated, collapsed)
+            if articles:
+                await run_in_executor("io", vectors.add, company, articles)
+            logger.info("Indexed %d new articles for %s", len(articles), company.strip(),
+                        extra={"company": company.strip(), "articles": len(articles)})
+    finally:
+        for claim in claims:
+            claim.close()
+        for lock in refreshing.values():
+            lock.release()
+
+    for lock in waiting:
+        async with lock:
+            pass
+
+    for company, error in failures.items():
+        logger.warning("Refresh failed for %s: %s", company.strip(), error)
+    if errors is not None:
+        errors.update(failures)
+    elif failures:
+        raise next(iter(failures.values()))
+
+    new_articles = {index.company_key(company): articles for company, (articles, _, _) in collected.items()}
+    return {company: new_articles.get(index.company_key(company), []) for company in companies}
+
+
+def _refresh_state(index, companies):
+    """
+    {company: (stored canonical URLs, latest stored articles)} for the deduplication of a refresh.
+    """
+    return {
+        company: (index.known_urls(company), index.articles(company, limit=DEDUP_WINDOW, with_embeddings=True))
+        for company in companies
+    }
+
+
+def _store(index, company, articles, collapsed):
+    index.upsert(company, articles)
+    index.mark_seen(company, [a['url'] for a in collapsed])
+    index.mark_refreshed(company)
+
+
+def _refreshed_since(index, companies, since):
+    return [company for company in companies if index.refreshed_at(company) >= since]
+
+
+def _stale(index, companies, max_age):
+    now = time.time()
+    return [company for company in companies if now - index.refreshed_at(company) > max_age]
+
+
+def _articles_batch(index, companies, limit):
+    return {
+        company: index.articles(company, limit=limit, with_embeddings=True, with_text=False) for company in companies
+    }
+
+
+async def refresh_company_async(company, client, index=news_index, limit=Config.INDEX_REFRESH_LIMIT):
+    """
+    refresh_companies_async for a single company. Returns the newly indexed articles.
+    """
+    return (await refresh_companies_async([company], client, index, limit))[company]
+
+
+async def get_indexed_articles_async(company, client, limit=10, max_age=Config.INDEX_MAX_AGE_SECONDS,
+                                     index=news_index, with_embeddings=True, with_text=False):
+    """
+    Latest processed articles for a company, served from the index. The index is refreshed first
+    (new items only) when it is older than `max_age` seconds. Without the index, articles are fetched
+    and processed from scratch. Article bodies are only loaded with `with_text`, as the analysis
+    works from the summaries.
+    """
+    if not index.enabled:
+        return await get_news_articles_async(company, client, limit=limit)
+
+    if await run_in_executor("io", _stale, index, [company], max_age):
+        await refresh_company_async(company, client, index)
+    return await run_in_executor(
+        "io", index.articles, company, limit=limit, with_embeddings=with_embeddings, with_text=with_text
+    )
+
+
+async def get_indexed_articles_batch_async(companies, client, limit=10, max_age=Config.INDEX_MAX_AGE_SECONDS,
+                                           index=news_index, errors=None):
+    """
+    get_indexed_articles_async for many companies; the stale ones are refreshed together in one
+    pooled pass. Returns {company: articles}. With an `errors` dict, a company whose refresh failed is
+    served the articles already in the index and its error is recorded there instead of being raised.
+    """
+    if not index.enabled:
+        return await get_news_articles_batch_async(companies, client, limit=limit)
+
+    stale = await run_in_executor("io", _stale, index, companies, max_age)
+    if stale:
+        await refresh_companies_async(stale, client, index, errors=errors)
+    return await run_in_executor("io", _articles_batch, index, companies, limit)
+
+
+async def stream_indexed_articles_async(company, client, limit=10, max_age=Config.INDEX_MAX_AGE_SECONDS,
+                                        index=news_index, vectors=vector_store):
+    """
+    Articles for the streaming analysis. With the index, the stored articles are yielded at once; when
+    the index is older than `max_age` it is then refreshed, and each new article (up to `limit`) is
+    yielded as soon as it has been processed and stored. Without the index each article is yielded as
+    soon as it has been processed.
+    """
+    if not index.enabled:
+        async for article in stream_news_articles_async(company, client, limit=limit):
+            yield article
+        return
+
+    stale = await run_in_executor("io", _stale, index, [company], max_age)
+    stored = await run_in_executor("io", index.articles, company, limit=limit, with_embeddings=True, with_text=False)
+    seen = set()
+    for article in stored:
+        seen.add(canonicalize_url(article['url']))
+        yield article
+    if not stale:
+        return
+
+    async for article in _stream_refresh_async(company, client, index, limit, vectors):
+        seen.add(canonicalize_url(article['url']))
+        yield article
+
+    # New articles that a concurrent refresh of the company indexed while this one waited for it
+    latest = await run_in_executor("io", index.articles, company, limit=limit, with_embeddings=True, with_text=False)
+    for article in latest:
+        if canonicalize_url(article['url']) not in seen:
+            yield article
+
+
+async def _stream_refresh_async(company, client, index, limit, vectors):
+    """
+    refresh_companies_async for one company, yielding each new article once it is stored. Yields
+    nothing when another refresh of the company is running or has just finished.
+    """
+    lock = _refresh_locks.setdefault(index.company_key(company), asyncio.Lock())
+    if lock.locked():
+        async with lock:
+            return
+
+    started = time.time()
+    async with lock:
+        claim = await _claim_refresh(index, company)
+        try:
+            if await run_in_executor("io", _refreshed_since, index, [company], started):
+                return
+            known, stored = (await run_in_executor("io", _refresh_state, index, [company]))[company]
+            fetched = await fetch_bing_news_links_async(company, client, limit=FEED_MAX_ITEMS, raise_errors=True)
+            fetched = [a for a in fetched if canonicalize_url(a['url']) not in known]
+
+            counts = [a['syndication_count'] for a in stored]
+            dedup = ArticleDeduplicator()
+            dedup.seed(stored)
+            async for article in stream_processed_articles_async(
+                dedup.filter(fetched, "url", "title"), client, dedup, limit=limit
+            ):
+                article['embedding'] = (await run_in_executor("embedding", encode_texts, [article['summary']]))[0]
+                await run_in_executor("io", index.upsert, company, [article])
+                await run_in_executor("io", vectors.add, company, [article])
+                yield article
+
+            syndicated = [a for a, count in zip(stored, counts) if a['syndication_count'] != count]
+            await run_in_executor("io", _store, index, company, syndicated, dedup.collapsed)
+        finally:
+            claim.close()
+
+
+def _try_lock(path):
+    """
+    The open lock file if this process got an exclusive lock on it, else None. The lock is held until
+    the file is closed or the process exits.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    lock = open(path, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+async def _claim_refresh(index, company):
+    """
+    Lock on refreshing `company` shared by the server processes, waited for without blocking the loop.
+    """
+    path = os.path.join(index.path + ".locks", f"{content_hash(index.company_key(company))}.lock")
+    while True:
+        lock = _try_lock(path)
+        if lock is not None:
+            return lock
+        await asyncio.sleep(REFRESH_LOCK_POLL_SECONDS)
+
+
+async def run_refresher(client, index=news_index, interval=Config.INDEX_REFRESH_SECONDS):
+    """
+    Background loop that keeps every watched company's index fresh, refreshing the stale ones together.
+    When several server processes share the index, only the one holding the refresher lock refreshes;
+    the others keep trying to take it over.
+    """
+    lock = None
+    try:
+        while True:
+            lock = lock or _try_lock(index.path + ".refresher.lock")
+            if lock is not None:
+                await _refresh_watched(client, index, interval)
+            await asyncio.sleep(min(interval, 30))
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+async def _refresh_watched(client, index, interval):
+    stale = []
+    try:
+        stale = await run_in_executor("io", lambda: _stale(index, index.watched(), interval))
+        if stale:
+            await refresh_companies_async(stale, client, index)
+    except Exception as e:
+        logger.warning("Background refresh failed for %s: %s", ", ".join(stale) or "watched companies", e)
@@ -1,132 +1,481 @@
-import requests
+import asyncio
+import logging
 from bs4 import BeautifulSoup
 import re
 import random
 import time
-import hashlib
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 
-from utils.SentimentAnalysis import get_sentiment
-from utils.Summarizer import get_summary
+from utils.Article import Article
+from utils.ArticleExtractor import ArticleExtractor
+from utils.Cache import cache, content_hash
+from utils.Dedup import ArticleDeduplicator, deduplicate
+from utils import Config
+from utils.Executors import map_in_executor, run_in_executor
+from utils.HttpClient import get_http_client
+from utils.Metrics import ARTICLES_PROCESSED, observe_batch, record_failure, span
+from utils.SentimentAnalysis import get_sentiments
+from utils.Summarizer import get_summaries, get_summary
 
-def fetch_bing_news_links(company_name, limit=10):
+logger = logging.getLogger(__name__)
+
+# Concurrency limits for article page fetches
+MAX_FETCH_WORKERS = 8
+PER_DOMAIN_CONCURRENCY = 2
+PER_DOMAIN_MIN_INTERVAL = 0.5  # seconds between request starts to the same domain
+
+# Feed items read per query; pages are only fetched for as many as are needed
+FEED_MAX_ITEMS = 100
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)',
+    'Mozilla/5.0 (X11; Linux x86_64)'
+]
+
+_domain_limits = {}
+_domain_limits_lock = threading.Lock()
+# asyncio primitives belong to one event loop, so async limits are kept per loop
+_async_domain_limits = weakref.WeakKeyDictionary()
+
+
+class _DomainLimit:
     """
-    Fetch news article links from Bing News RSS based on a single clean query.
-    Guarantees collection of `limit` unique articles by paginating results if needed.
+    Per-domain politeness: caps in-flight requests and spaces out request starts.
     """
+    def __init__(self):
+        self.semaphore = threading.Semaphore(PER_DOMAIN_CONCURRENCY)
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def reserve_slot(self):
+        """
+        Reserve the next start time for this domain and return how long to wait for it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + PER_DOMAIN_MIN_INTERVAL
+        return slot - now
+
+    def wait_turn(self):
+        delay = self.reserve_slot()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _AsyncDomainLimit(_DomainLimit):
+    """
+    Same politeness rules for coroutines: an asyncio semaphore and non-blocking waits.
+    """
+    def __init__(self):
+        super().__init__()
+        self.semaphore = asyncio.Semaphore(PER_DOMAIN_CONCURRENCY)
+
+    async def wait_turn(self):
+        delay = self.reserve_slot()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _domain_limit(url):
+    domain = urlparse(url).netloc.lower()
+    with _domain_limits_lock:
+        limit = _domain_limits.get(domain)
+        if limit is None:
+            limit = _domain_limits[domain] = _DomainLimit()
+        return limit
+
+
+def _async_domain_limit(url):
+    domain = urlparse(url).netloc.lower()
+    limits = _async_domain_limits.setdefault(asyncio.get_running_loop(), {})
+    limit = limits.get(domain)
+    if limit is None:
+        limit = limits[domain] = _AsyncDomainLimit()
+    return limit
+
+
+def polite_extract_article_text(url):
+    """
+    Extract article text while respecting the per-domain politeness limits.
+    """
+    limit = _domain_limit(url)
+    with limit.semaphore:
+        limit.wait_turn()
+        return extract_article_text(url)
+
+
+def iter_article_texts(articles, max_workers=MAX_FETCH_WORKERS):
+    """
+    Fetch article pages concurrently and yield (article, text) pairs as each page arrives.
+    Falls back to the RSS summary when a page cannot be extracted.
+    """
+    if not articles:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(articles))) as executor:
+        futures = {executor.submit(polite_extract_article_text, a.url): a for a in articles}
+        for future in as_completed(futures):
+            article = futures[future]
+            yield article, future.result() or article.summary
+
+
+def bing_news_rss_url(company_name):
     query = company_name.strip()
+    return f"{Config.BING_NEWS_URL}?q={query.replace(' ', '+')}&format=rss"
+
+
+def parse_bing_rss(content, limit=10):
+    """
+    Parse a Bing News RSS document into Article records, skipping repeated links.
+    """
     collected_articles = []
     seen_urls = set()
 
-    print(f"[INFO] Querying Bing RSS: {query}")
+    soup = BeautifulSoup(content, features="xml")
+    items = soup.find_all('item')
+
+    for item in items:
+        link = item.link.text.strip()
+        if link in seen_urls:
+            continue
+
+        title = item.title.text.strip()
+        summary = item.description.text.strip()
+        pub_date = item.pubDate.text if item.pubDate else "Unknown"
+
+        collected_articles.append(Article(url=link, title=title, summary=summary, publish_date=pub_date))
+
+        seen_urls.add(link)
+
+        if len(collected_articles) >= limit:
+            break
+
+    return collected_articles
+
+
+def parse_article_html(html):
+    """
+    Join the paragraph text of an article page.
+    Reference extractor kept for benchmarks/extraction.py; the fetchers use ArticleExtractor.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    text = " ".join(p.text for p in soup.find_all('p'))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def fetch_bing_news_links(company_name, limit=10, client=None):
+    """
+    Fetch news article links from Bing News RSS based on a single clean query.
+    Guarantees collection of `limit` unique articles by paginating results if needed.
+    The feed is requested conditionally, so an unchanged feed is not downloaded again.
+    """
+    client = client or get_http_client()
+    collected_articles = []
+
+    logger.info("Querying Bing RSS: %s", company_name.strip())
 
-    url = f"https://www.bing.com/news/search?q={query.replace(' ', '+')}&format=rss"
-    
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code != 200:
-            print(f"[WARN] Bing RSS fetch failed with status code {response.status_code}")
-            return []
+        with span("fetch"):
+            response = client.get(bing_news_rss_url(company_name), conditional=True)
+            if response.status_code != 200:
+                record_failure("fetch")
+                logger.warning("Bing RSS fetch failed with status code %s", response.status_code)
+                return []
 
-        soup = BeautifulSoup(response.content, features="xml")
-        items = soup.find_all('item')
+            collected_articles = parse_bing_rss(response.content, limit)
 
-        for item in items:
-            link = item.link.text.strip()
-            if link in seen_urls:
-                continue
+    except Exception as e:
+        logger.error("Failed to fetch news links: %s", e)
 
-            title = item.title.text.strip()
-            summary = item.description.text.strip()
-            pub_date = item.pubDate.text if item.pubDate else "Unknown"
+    logger.info("Total unique articles collected: %d", len(collected_articles))
+    return collected_articles
+
+
+def extract_article_text(url, client=None):
+    """
+    Download an article page and extract its main body text.
+    The page is streamed through ArticleExtractor and the download stops once enough body text has been read.
+    Successfully extracted pages are kept in the result cache, keyed by URL.
+    """
+    key = content_hash(url)
+    cached = cache.get("article_text", "main-body", key)
+    if cached is not None:
+        return cached
 
-            collected_articles.append({
-                'title': title,
-                'summary': summary,
-                'url': link,
-                'publish_date': pub_date
-            })
+    client = client or get_http_client()
+    try:
+        with span("extract"):
+            headers = {'User-Agent': random.choice(USER_AGENTS)}
+            extractor = ArticleExtractor()
+            response = client.get(url, headers=headers, consumer=extractor)
+            if response.status_code != 200:
+                record_failure("extract")
+                return None
+            text = extractor.text
+        if text:
+            cache.set("article_text", "main-body", key, text)
+        return text
+    except Exception as e:
+        logger.error("Extract text failed for %s: %s", url, e)
+        return None
 
-            seen_urls.add(link)
 
-            if len(collected_articles) >= limit:
-                break
+# ------------------ ASYNC FETCHING ------------------ #
+
+class FeedUnavailable(Exception):
+    """
+    The Bing RSS feed could not be fetched.
+    """
+
+
+async def fetch_bing_news_links_async(company_name, client, limit=10, raise_errors=False):
+    """
+    Async variant of fetch_bing_news_links using a shared AsyncHttpClient. With `raise_errors`, a failed
+    fetch raises FeedUnavailable instead of returning no articles.
+    """
+    collected_articles = []
+
+    logger.info("Querying Bing RSS: %s", company_name.strip())
+
+    try:
+        with span("fetch"):
+            response = await client.get(bing_news_rss_url(company_name), conditional=True)
+            if response.status_code != 200:
+                raise FeedUnavailable(f"Bing RSS fetch failed with status code {response.status_code}")
+
+            collected_articles = parse_bing_rss(response.content, limit)
 
     except Exception as e:
-        print(f"[ERROR] Failed to fetch news links: {e}")
+        logger.error("Failed to fetch news links: %s", e)
+        if raise_errors:
+            if isinstance(e, FeedUnavailable):
+                raise
+            raise FeedUnavailable(f"Failed to fetch news links: {e}") from e
 
-    print(f"[INFO] Total unique articles collected: {len(collected_articles)}")
+    logger.info("Total unique articles collected: %d", len(collected_articles))
     return collected_articles
 
 
-def extract_article_text(url):
+async def extract_article_text_async(url, client):
+    """
+    Async variant of extract_article_text that respects the per-domain politeness limits.
+    """
+    key = content_hash(url)
+    cached = cache.get("article_text", "main-body", key)
+    if cached is not None:
+        return cached
+
+    limit = _async_domain_limit(url)
     try:
-        headers = {'User-Agent': random.choice([
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)',
-            'Mozilla/5.0 (X11; Linux x86_64)'
-        ])}
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code != 200:
-            return None
-        soup = BeautifulSoup(response.text, 'html.parser')
-        text = " ".join(p.text for p in soup.find_all('p'))
-        return re.sub(r'\s+', ' ', text).strip()
+        async with limit.semaphore:
+            await limit.wait_turn()
+            with span("extract"):
+                headers = {'User-Agent': random.choice(USER_AGENTS)}
+                extractor = ArticleExtractor()
+                response = await client.get(url, headers=headers, consumer=extractor)
+                if response.status_code != 200:
+                    record_failure("extract")
+                    return None
+                text = extractor.text
+        if text:
+            cache.set("article_text", "main-body", key, text)
+        return text
     except Exception as e:
-        print(f"[ERROR] Extract text failed: {e}")
+        logger.error("Extract text failed for %s: %s", url, e)
         return None
 
 
+async def iter_article_texts_async(articles, client):
+    """
+    Fetch article pages concurrently on the async client and yield (position, article) pairs, with the
+    article's 'text' filled in (falling back to the RSS summary), as soon as each page arrives.
+    """
+    async def fetch(position, article):
+        article.text = await extract_article_text_async(article.url, client) or article.summary
+        return position, article
+
+    for next_article in asyncio.as_completed([fetch(i, a) for i, a in enumerate(articles)]):
+        yield await next_article
+
+
 def deduplicate_articles(articles):
-    seen_hashes = set()
-    seen_urls = set()
-    unique = []
-    for a in articles:
-        key = hashlib.md5((a['title'] + a['summary']).encode()).hexdigest()
-        if key in seen_hashes or a['url'] in seen_urls:
-            continue
-        seen_hashes.add(key)
-        seen_urls.add(a['url'])
-        unique.append(a)
-    return unique
+    """
+    Collapse syndicated copies (same canonical URL, or near-duplicate title or text) onto the first
+    copy, which records the number of copies in 'syndication_count'.
+    """
+    return deduplicate(articles)
 
 
 def get_news_articles(company_name, limit=10):
     """
     Main function to fetch, extract, summarize, analyze sentiment and deduplicate articles.
-    Guarantees 'limit' articles after deduplication by refetching if needed.
+    The feed is fetched once; its items are processed in waves until 'limit' unique articles are collected.
+    Syndicated copies are collapsed before the expensive steps: by URL and title before pages are fetched,
+    and by text before summarizing.
+    Sentiment is scored over the full article text for all collected articles in a single batched model pass.
     """
+    dedup = ArticleDeduplicator()
+    candidates = dedup.filter(fetch_bing_news_links(company_name, limit=FEED_MAX_ITEMS), "url", "title")
     all_articles = []
-    seen_urls = set()
 
-    while len(all_articles) < limit:
+    while candidates and len(all_articles) < limit:
         remaining = limit - len(all_articles)
-        fetched = fetch_bing_news_links(company_name, limit=remaining)
+        new_articles, candidates = candidates[:remaining], candidates[remaining:]
 
-        if not fetched:
-            print("[WARN] No more articles could be fetched. Breaking early.")
-            break
+        # Pages are fetched concurrently, then summarized in one batch
+        for article, text in iter_article_texts(new_articles):
+            logger.debug("Processing article: %s", article.title)
+            article.text = text
 
-        # Deduplicate against already collected
-        for article in fetched:
-            if article['url'] in seen_urls:
-                continue
+        new_articles = dedup.filter(new_articles, "text")
+        observe_batch("summary", len(new_articles))
+        with span("summarize"):
+            summaries = get_summaries([a.text for a in new_articles])
+        for article, summary in zip(new_articles, summaries):
+            article.summary = summary
 
-            print(f"[INFO] Processing article: {article['title']}")
-            text = extract_article_text(article['url']) or article['summary']
-            article['text'] = text
-            article['summary'] = get_summary(text)
-            sentiment = get_sentiment(text)
-            article['sentiment'] = sentiment['sentiment']
-            article['sentiment_score'] = sentiment['score']
+        # Keep the feed's ranking rather than page arrival order
+        all_articles.extend(new_articles)
 
-            all_articles.append(article)
-            seen_urls.add(article['url'])
+    if len(all_articles) < limit:
+        logger.warning("Only %d unique articles available in the feed", len(all_articles))
 
-            if len(all_articles) >= limit:
-                break
+    final_articles = all_articles[:limit]
 
-            time.sleep(random.uniform(1.5, 2.5))
+    sentiments = get_sentiments([a.text for a in final_articles], long_document=True)
+    for article, sentiment in zip(final_articles, sentiments):
+        article.sentiment = sentiment['sentiment']
+        article.sentiment_score = sentiment['score']
 
-    # Final deduplication (edge case safety)
-    final_articles = deduplicate_articles(all_articles)[:limit]
+    ARTICLES_PROCESSED.inc(len(final_articles))
     return final_articles
+
+
+async def collect_article_texts_async(candidates, client, dedup, limit=10):
+    """
+    Fetch article pages in waves on the shared async client until `limit` articles with distinct
+    texts are collected; near-duplicate texts are dropped. Returns articles in feed order.
+    """
+    articles = []
+    while candidates and len(articles) < limit:
+        remaining = limit - len(articles)
+        wave, candidates = candidates[:remaining], candidates[remaining:]
+
+        positions, fetched = [], []
+        async for position, article in iter_article_texts_async(wave, client):
+            logger.debug("Processing article: %s", article.title)
+            positions.append(position)
+            fetched.append(article)
+
+        # Keep the feed's ranking rather than page arrival order
+        fetched = [article for _, article in sorted(zip(positions, fetched), key=lambda pair: pair[0])]
+        articles.extend(dedup.filter(fetched, "text"))
+    return articles
+
+
+async def score_articles_async(articles):
+    """
+    Summarize and score articles in place: summaries are computed in batches spread over the summary
+    process pool, and sentiment is scored in one batch on the sentiment worker.
+    """
+    observe_batch("summary", len(articles))
+    with span("summarize"):
+        summaries = await map_in_executor(
+            "summary", get_summaries, [a.text for a in articles], Config.SUMMARY_WORKERS
+        )
+    for article, summary in zip(articles, summaries):
+        article.summary = summary
+
+    sentiments = await run_in_executor(
+        "sentiment", get_sentiments, [a.text for a in articles], long_document=True
+    )
+    for article, sentiment in zip(articles, sentiments):
+        article.sentiment = sentiment['sentiment']
+        article.sentiment_score = sentiment['score']
+
+    ARTICLES_PROCESSED.inc(len(articles))
+    return articles
+
+
+async def process_articles_async(candidates, client, dedup, limit=10):
+    """
+    Fetch, summarize and score feed items until `limit` unique articles are collected.
+    """
+    articles = await collect_article_texts_async(candidates, client, dedup, limit=limit)
+    return await score_articles_async(articles)
+
+
+async def get_news_articles_async(company_name, client, limit=10):
+    """
+    Async counterpart of get_news_articles for the API server.
+    """
+    dedup = ArticleDeduplicator()
+    fetched = await fetch_bing_news_links_async(company_name, client, limit=FEED_MAX_ITEMS)
+    return await process_articles_async(dedup.filter(fetched, "url", "title"), client, dedup, limit=limit)
+
+
+async def get_news_articles_batch_async(company_names, client, limit=10):
+    """
+    get_news_articles_async for many companies at once: feeds and pages are fetched concurrently, and the
+    articles of every company are pooled into shared summary and sentiment passes.
+    Returns {company name: articles}.
+    """
+    async def collect(company_name):
+        dedup = ArticleDeduplicator()
+        fetched = await fetch_bing_news_links_async(company_name, client, limit=FEED_MAX_ITEMS)
+        return await collect_article_texts_async(dedup.filter(fetched, "url", "title"), client, dedup, limit=limit)
+
+    collected = await asyncio.gather(*(collect(name) for name in company_names))
+    await score_articles_async([article for articles in collected for article in articles])
+    return dict(zip(company_names, collected))
+
+
+async def stream_processed_articles_async(candidates, client, dedup, limit=10):
+    """
+    Fetch, summarize and score feed items in waves until `limit` unique articles are out, yielding each
+    article as soon as it is ready. Near-duplicate texts are dropped before they are summarized.
+    """
+    async def process(article):
+        article.text = await extract_article_text_async(article.url, client) or article.summary
+        if not dedup.by_text(article):
+            return None
+        observe_batch("summary", 1)
+        with span("summarize"):
+            article.summary = await run_in_executor("summary", get_summary, article.text)
+        sentiments = await run_in_executor("sentiment", get_sentiments, [article.text], long_document=True)
+        article.sentiment = sentiments[0]['sentiment']
+        article.sentiment_score = sentiments[0]['score']
+        ARTICLES_PROCESSED.inc()
+        return article
+
+    produced = 0
+    while candidates and produced < limit:
+        wave, candidates = candidates[:limit - produced], candidates[limit - produced:]
+        for next_article in asyncio.as_completed([process(a) for a in wave]):
+            article = await next_article
+            if article is None:
+                continue
+            logger.debug("Processed article: %s", article.title)
+            produced += 1
+            yield article
+
+
+async def stream_news_articles_async(company_name, client, limit=10):
+    """
+    Yield fully processed articles (text, summary and sentiment) one at a time, as soon as each is ready,
+    instead of waiting for the whole batch. Like the other paths, the whole feed is fetched and its items
+    are processed in waves until `limit` unique articles are out. Syndicated copies are dropped as they
+    arrive, before they are summarized; a representative's 'syndication_count' can still grow after it
+    has been yielded.
+    """
+    dedup = ArticleDeduplicator()
+    candidates = dedup.filter(
+        await fetch_bing_news_links_async(company_name, client, limit=FEED_MAX_ITEMS), "url", "title"
+    )
+    async for article in stream_processed_articles_async(candidates, client, dedup, limit=limit):
+        yield article
@@ -0,0 +1,178 @@
+import functools
+import importlib.util
+import re
+import zlib
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+from utils import Config
+
+'''
+Response encoding for the API.
+  - FastJSONResponse: JSON serialized by orjson. Routes that build large reports return it directly,
+    which also skips FastAPI's per-field jsonable_encoder pass.
+  - CompressionMiddleware: brotli (when the brotli package is installed) or gzip, whichever the client
+    accepts, for text and JSON responses above a minimum size. Audio and event streams are sent as they are.
+  - parse_range: the byte range of a single-range "Range" header.
+'''
+
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+
+_JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_dumps(data):
+    return orjson.dumps(data, option=_JSON_OPTIONS).decode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content, option=_JSON_OPTIONS)
+
+
+# ------------------ COMPRESSION ------------------ #
+
+# Media types worth compressing; anything else (audio, event streams, ...) is sent as it is
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/javascript", "application/xml", "image/svg+xml",
+    "text/plain", "text/html", "text/css", "text/csv", "text/xml", "text/markdown"
+}
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, final):
+        flush = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush)
+
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality):
+        import brotli
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, final):
+        body = self._compressor.process(data)
+        return body + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def _accepted_encodings(header):
+    """
+    Content codings the client accepts (q > 0), from an Accept-Encoding header.
+    """
+    accepted = set()
+    for item in header.lower().split(","):
+        coding, _, params = item.partition(";")
+        q = re.search(r"q=([0-9.]+)", params)
+        try:
+            if q is None or float(q.group(1)) > 0:
+                accepted.add(coding.strip())
+        except ValueError:
+            continue
+    return accepted
+
+
+def _compressible(headers):
+    media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return media_type in COMPRESSIBLE_TYPES and "content-encoding" not in headers
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip, preferring brotli, when their media type is in
+    COMPRESSIBLE_TYPES and the body is at least `minimum_size` bytes. Streamed bodies are compressed
+    chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size=Config.COMPRESSION_MIN_BYTES, gzip_level=Config.GZIP_LEVEL,
+                 brotli_quality=Config.BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoder(self, scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if BROTLI_AVAILABLE and "br" in accepted:
+            return functools.partial(_BrotliEncoder, self.brotli_quality)
+        if "gzip" in accepted:
+            return functools.partial(_GzipEncoder, self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        encoder = self._encoder(scope) if scope["type"] == "http" else None
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoding = None  # set once the response is known to be compressed
+
+        async def send_compressed(message):
+            nonlocal start, encoding
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if start is not None:
+                response_start, start = start, None
+                headers = MutableHeaders(raw=response_start["headers"])
+                if not _compressible(headers):
+                    await send(response_start)
+                elif not more_body and len(body) < self.minimum_size:
+                    headers.add_vary_header("Accept-Encoding")
+                    await send(response_start)
+                else:
+                    encoding = encoder()
+                    headers["Content-Encoding"] = encoding.name
+                    headers.add_vary_header("Accept-Encoding")
+                    body = encoding.compress(body, final=not more_body)
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+                    await send(response_start)
+                    await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                    return
+            elif encoding is not None:
+                body = encoding.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+# ------------------ RANGES ------------------ #
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive byte positions requested by a "Range: bytes=..." header for a body of `size`
+    bytes. Returns None when the whole body should be sent (no header, or one that is malformed, has
+    several ranges or another unit) and raises ValueError when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)-(\d*)\s*", header or "", re.IGNORECASE)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - int(last)), size - 1
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
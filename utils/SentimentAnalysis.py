@@ -1,26 +1,40 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
-import os
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import logging
+import torch
 
-'''
-# Load model and tokenizer from local directory
-BASE_PATH = os.path.join(os.path.dirname(__file__), "..", "hf_model")
+from utils import Config
+from utils.Cache import cache
+from utils.InferenceBackend import build_sequence_classifier, cache_model_name, check_backend
+from utils.Metrics import observe_batch, span
+from utils.Models import register
 
-TOKENIZER_PATH = os.path.join(BASE_PATH, "tokenizer")
-MODEL_PATH = os.path.join(BASE_PATH, "model")
+logger = logging.getLogger(__name__)
 
-tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_PATH)
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
-'''
-
-# Load model and tokenizer directly from Hugging Face
 MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
 
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
 
+def _load_sentiment_model(backend=None):
+    backend = check_backend(backend or Config.SENTIMENT_BACKEND)
+    if Config.MODEL_SOURCE == "local":
+        # Load model and tokenizer from local directory
+        tokenizer = AutoTokenizer.from_pretrained(Config.SENTIMENT_TOKENIZER_PATH)
+        model = AutoModelForSequenceClassification.from_pretrained(Config.SENTIMENT_MODEL_PATH)
+    else:
+        # Load model and tokenizer directly from Hugging Face
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+    model.eval()
+    return tokenizer, build_sequence_classifier(model, MODEL_NAME, backend)
+
+
+_sentiment_model = register("sentiment", _load_sentiment_model, fork_safe=Config.SENTIMENT_BACKEND != "onnx")
 
-# Create pipeline
-sentiment_pipeline = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+def get_sentiment_model():
+    """
+    Returns the (tokenizer, model) pair, loading it on first use.
+    """
+    return _sentiment_model.get()
 
 # Label map – handle both label types
 LABEL_MAP = {
@@ -32,33 +46,148 @@ LABEL_MAP = {
     "POSITIVE": "Positive"
 }
 
+MAX_TOKENS = 512
+BATCH_SIZE = 16
+MAX_WINDOWS_PER_TEXT = 32  # bounds work and memory for very long pages
+AGGREGATIONS = ("weighted", "max")
+# Overlap of consecutive windows: the tokenizer rejects strides that leave no room for new tokens
+# once the two special tokens are added
+MAX_STRIDE = MAX_TOKENS - 3
+
+
+def _to_result(raw_label, score):
+    raw_label = raw_label.strip().upper()
+    score = round(score, 3)
+
+    sentiment = LABEL_MAP.get(raw_label)
+    if not sentiment:
+        if score >= 0.75:
+            sentiment = "Positive"
+        elif score <= 0.55:
+            sentiment = "Negative"
+        else:
+            sentiment = "Neutral"
+
+    return {
+        "sentiment": sentiment,
+        "score": score
+    }
+
+
+def _encode_windows(tokenizer, texts, long_document, stride, max_windows):
+    """
+    Tokenize texts into model-sized windows.
+    Returns the windows' input ids, attention masks and the index of the text each window belongs to.
+    """
+    if not long_document:
+        encodings = tokenizer(texts, truncation=True, max_length=MAX_TOKENS)
+        return encodings["input_ids"], encodings["attention_mask"], list(range(len(texts)))
+
+    encodings = tokenizer(
+        texts,
+        truncation=True,
+        max_length=MAX_TOKENS,
+        stride=stride,
+        return_overflowing_tokens=True
+    )
+
+    input_ids, attention_mask, owners = [], [], []
+    windows_per_text = [0] * len(texts)
+    for ids, mask, owner in zip(encodings["input_ids"], encodings["attention_mask"],
+                                encodings["overflow_to_sample_mapping"]):
+        if windows_per_text[owner] >= max_windows:
+            continue
+        windows_per_text[owner] += 1
+        input_ids.append(ids)
+        attention_mask.append(mask)
+        owners.append(owner)
+    return input_ids, attention_mask, owners
+
+
+def _predict(texts, batch_size, long_document, stride, aggregation, max_windows):
+    tokenizer, model = get_sentiment_model()
+    input_ids, attention_mask, owners = _encode_windows(tokenizer, texts, long_document, stride, max_windows)
+    order = sorted(range(len(input_ids)), key=lambda i: len(input_ids[i]))
+
+    num_labels = model.config.num_labels
+    # Per-text accumulators keep memory proportional to the number of texts, not windows
+    combined = torch.zeros(len(texts), num_labels)
+    weights = torch.zeros(len(texts))
+    best = torch.full((len(texts),), -1.0)
+
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            observe_batch("sentiment", len(batch_idx))
+            batch = tokenizer.pad(
+                {"input_ids": [input_ids[i] for i in batch_idx],
+                 "attention_mask": [attention_mask[i] for i in batch_idx]},
+                return_tensors="pt"
+            )
+            probs = torch.softmax(model(**batch).logits, dim=-1)
+            batch_owners = torch.tensor([owners[i] for i in batch_idx])
+
+            if aggregation == "weighted":
+                lengths = batch["attention_mask"].sum(dim=-1).to(probs.dtype)
+                combined.index_add_(0, batch_owners, probs * lengths.unsqueeze(-1))
+                weights.index_add_(0, batch_owners, lengths)
+            else:
+                for owner, window_probs in zip(batch_owners.tolist(), probs):
+                    confidence = window_probs.max().item()
+                    if confidence > best[owner]:
+                        best[owner] = confidence
+                        combined[owner] = window_probs
+
+    if aggregation == "weighted":
+        combined = combined / weights.clamp(min=1.0).unsqueeze(-1)
+
+    scores, label_ids = combined.max(dim=-1)
+    return [
+        _to_result(model.config.id2label[label_id], score)
+        for score, label_id in zip(scores.tolist(), label_ids.tolist())
+    ]
+
+
+def get_sentiments(texts, batch_size=BATCH_SIZE, long_document=False, stride=0,
+                   aggregation="weighted", max_windows=MAX_WINDOWS_PER_TEXT):
+    """
+    Performs batched sentiment analysis on a list of texts.
+    By default texts are truncated to the model's token limit. With long_document=True each text is
+    split into token windows (overlapping by `stride` tokens), every window is scored in the same
+    batched pass, and window scores are combined per text:
+      - "weighted": token-count weighted average of the window probabilities
+      - "max": the prediction of the most confident window
+    Inputs are sorted by length to minimise padding, and previously scored texts are served from the
+    result cache.
+    Returns: list of dicts with sentiment label and score, in the original order
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {AGGREGATIONS}")
+    if not 0 <= stride <= MAX_STRIDE:
+        raise ValueError(f"stride must be between 0 and {MAX_STRIDE}, got {stride}")
+
+    mode = f"windows-{stride}-{aggregation}-{max_windows}" if long_document else "truncate"
+    try:
+        with span("sentiment"):
+            return cache.cached_map(
+                "sentiment",
+                f"{cache_model_name(MODEL_NAME, Config.SENTIMENT_BACKEND)}:{mode}",
+                texts,
+                lambda missing: _predict(missing, batch_size, long_document, stride, aggregation, max_windows)
+            )
+
+    except (RuntimeError, OSError) as e:
+        # Model failures (loading, inference); invalid input is raised to the caller
+        logger.error("Batched sentiment analysis failed: %s", e)
+        return [{"sentiment": "Unknown", "score": 0.0} for _ in texts]
+
+
 def get_sentiment(text):
     """
     Performs sentiment analysis on the input text using a transformer model.
     Returns: dict with sentiment label and score
     """
-    try:
-        result = sentiment_pipeline(text[:512])[0]
-        raw_label = result['label'].strip().upper()
-        score = round(result['score'], 3)
-
-        sentiment = LABEL_MAP.get(raw_label)
-        if not sentiment:
-            if score >= 0.75:
-                sentiment = "Positive"
-            elif score <= 0.55:
-                sentiment = "Negative"
-            else:
-                sentiment = "Neutral"
-
-        return {
-            "sentiment": sentiment,
-            "score": score
-        }
-
-    except Exception as e:
-        print(f"[ERROR] Sentiment analysis failed: {e}")
-        return {
-            "sentiment": "Unknown",
-            "score": 0.0
-        }
+    return get_sentiments([text])[0]
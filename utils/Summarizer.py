@@ -1,28 +1,175 @@
+import logging
+import re
+from collections import Counter
+
 import nltk
+import numpy as np
+from scipy import sparse
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
 from sumy.summarizers.lex_rank import LexRankSummarizer
-import os
 
-'''
+from utils import Config
+from utils.Cache import cache
+from utils.Models import register
+
+logger = logging.getLogger(__name__)
+
 # NLTK Setup (Safe for Docker)
-NLTK_DATA_DIR = os.path.join(os.path.dirname(__file__), "nltk_data")
-nltk.data.path.append(NLTK_DATA_DIR)
-'''
+nltk.data.path.append(Config.NLTK_DATA_DIR)
+
+# Same parameters as sumy's LexRankSummarizer
+LEXRANK_THRESHOLD = 0.1
+LEXRANK_EPSILON = 0.1
+LEXRANK_MAX_ITERATIONS = 1000
+
+
+def _ensure_nltk_data():
+    """
+    Make sure the punkt sentence tokenizer is available, downloading it only when missing.
+    """
+    for resource in ("punkt", "punkt_tab"):
+        try:
+            nltk.data.find(f"tokenizers/{resource}")
+        except LookupError:
+            nltk.download(resource, quiet=True)
+    return True
+
+
+_nltk_data = register("nltk", _ensure_nltk_data)
+
+
+def _load_tokenizer():
+    _nltk_data.get()
+    return Tokenizer("english")
+
+
+# One tokenizer for every call; building it loads the punkt model
+_tokenizer = register("summary-tokenizer", _load_tokenizer)
+
+
+def _split_sentences(text, tokenizer):
+    """
+    Split text into sentences the way sumy's PlaintextParser does:
+    blank lines separate paragraphs and all-uppercase lines are headings, which are skipped.
+    """
+    sentences = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in paragraph.splitlines()]
+        lines = [line for line in lines if line and not line.isupper()]
+        if lines:
+            sentences.extend(tokenizer.to_sentences(" ".join(lines)))
+    return sentences
+
+
+def _lexrank_scores(sentence_words):
+    """
+    LexRank sentence centrality with a sparse TF-IDF matrix, sparse thresholded cosine graph
+    and power iteration. Numerically equivalent to sumy's LexRankSummarizer.
+    """
+    n = len(sentence_words)
+    vocabulary = {}
+    rows, cols, tf = [], [], []
+    for row, words in enumerate(sentence_words):
+        counts = Counter(words)
+        if not counts:
+            continue
+        max_tf = max(counts.values())
+        for word, count in counts.items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+            tf.append(count / max_tf)
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    tf = np.asarray(tf, dtype=np.float64)
+
+    document_frequency = np.bincount(cols, minlength=len(vocabulary))
+    idf = np.log(n / (1.0 + document_frequency))
+    tfidf = sparse.csr_matrix((tf * idf[cols], (rows, cols)), shape=(n, len(vocabulary)))
+
+    norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    scale = sparse.diags(inverse_norms)
+    similarity = (scale @ (tfidf @ tfidf.T) @ scale).tocsr()
+
+    # Threshold into an unweighted graph, then row-normalise by degree
+    similarity.data = (similarity.data > LEXRANK_THRESHOLD).astype(np.float64)
+    similarity.eliminate_zeros()
+    degrees = np.asarray(similarity.sum(axis=1)).ravel()
+    degrees[degrees == 0] = 1.0
+    transition = (sparse.diags(1.0 / degrees) @ similarity).T.tocsr()
+
+    p_vector = np.full(n, 1.0 / n)
+    for _ in range(LEXRANK_MAX_ITERATIONS):
+        next_p = transition @ p_vector
+        norm = np.linalg.norm(next_p)
+        if norm == 0:
+            break
+        next_p /= norm
+        delta = np.linalg.norm(next_p - p_vector)
+        p_vector = next_p
+        if delta <= LEXRANK_EPSILON:
+            break
+    return p_vector
+
+
+def _lexrank_summary(text, sentence_count):
+    tokenizer = _tokenizer.get()
+    sentences = _split_sentences(text, tokenizer)
+    if not sentences:
+        return ""
+
+    sentence_words = [[word.lower() for word in tokenizer.to_words(s)] for s in sentences]
+    scores = _lexrank_scores(sentence_words)
+
+    # Best sentences by rating (ties keep document order), then presented in document order
+    best = np.argsort(-scores, kind="stable")[:sentence_count]
+    return " ".join(sentences[i] for i in sorted(best)).strip()
+
+
+def _sumy_summary(text, sentence_count):
+    """
+    Reference implementation using sumy's LexRank.
+    """
+    _nltk_data.get()
+    parser = PlaintextParser.from_string(text, _tokenizer.get())
+    summarizer = LexRankSummarizer()
+    summary_sentences = summarizer(parser.document, sentence_count)
+    return " ".join(str(sentence) for sentence in summary_sentences).strip()
+
+
+SUMMARIZERS = {
+    "lexrank": _lexrank_summary,
+    "sumy": _sumy_summary
+}
+
+
+def get_summaries(texts, sentence_count=3, backend=Config.SUMMARIZER_BACKEND):
+    """
+    Generates extractive LexRank summaries for a batch of texts, reusing one tokenizer across the batch.
+    Summaries of previously seen texts are served from the result cache.
+    """
+    summarize = SUMMARIZERS[backend]
+
+    def compute(missing):
+        summaries = []
+        for text in missing:
+            try:
+                summaries.append(summarize(text, sentence_count))
+            except Exception as e:
+                logger.error("Summary generation failed: %s", e)
+                summaries.append(None)
+        return summaries
+
+    texts = list(texts)
+    summaries = cache.cached_map("summary", f"{backend}-{sentence_count}", texts, compute)
+    # Failed summaries fall back to the start of the text and are not cached
+    return [summary if summary is not None else text[:300] for summary, text in zip(summaries, texts)]
 
-# Ensure tokenizer downloaded
-nltk.download("punkt", quiet=True)
 
 def get_summary(text, sentence_count=3):
     """
     Generates an extractive summary using LexRank.
     """
-    try:
-        parser = PlaintextParser.from_string(text, Tokenizer("english"))
-        summarizer = LexRankSummarizer()
-        summary_sentences = summarizer(parser.document, sentence_count)
-        summary_text = " ".join(str(sentence) for sentence in summary_sentences)
-        return summary_text.strip()
-    except Exception as e:
-        print(f"[ERROR] Summary generation failed: {e}")
-        return text[:300]
+    return get_summaries([text], sentence_count)[0]
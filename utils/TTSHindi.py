@@ -1,21 +1,102 @@
 from gtts import gTTS
-import os
+import base64
+import io
+import logging
+import re
+import threading
 
-def sentiment_distribution_to_hindi(sentiment_dist):
+from utils import Config
+from utils.Cache import cache, content_hash
+from utils.Metrics import span
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PHRASES = {
+    "mostly positive": "समाचार कवरेज मुख्य रूप से सकारात्मक है, जो कंपनी की अच्छी प्रगति को दर्शाता है।",
+    "mostly critical": "समाचार कवरेज मुख्य रूप से आलोचनात्मक है, जो प्रदर्शन की चिंताओं की ओर इशारा करता है।",
+    "largely neutral": "समाचार कवरेज अधिकतर तटस्थ है, जो संतुलित और तथ्यात्मक रिपोर्टिंग को दर्शाता है।",
+    "mixed": "समाचार कवरेज मिश्रित है, जिसमें विभिन्न दृष्टिकोण सामने आए हैं।",
+}
+DEFAULT_SUMMARY_PHRASE = "समाचार कवरेज में विविध विषय शामिल हैं।"
+DEFAULT_TONE = "varied"  # audio id tone for summaries that match none of SUMMARY_PHRASES
+_AUDIO_ID = re.compile(r"(0|[1-9][0-9]*)-(0|[1-9][0-9]*)-(0|[1-9][0-9]*)-([a-z-]+)")
+
+
+# ------------------ TTS BACKENDS ------------------ #
+
+class GTTSBackend:
     """
-    Convert sentiment distribution dict to a proper Hindi sentence.
+    Google Text-to-Speech, rendered into memory.
+    """
+    name = "gtts"
+
+    def synthesize(self, text, lang="hi"):
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class SilentBackend:
+    """
+    Offline stand-in that returns silent MP3 frames, roughly as long as the text would take to speak.
+    """
+    name = "silent"
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz frame (~26 ms) with empty side info
+    FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+    def synthesize(self, text, lang="hi"):
+        return self.FRAME * max(1, len(text) * 2)
+
+
+TTS_BACKENDS = {
+    "gtts": GTTSBackend,
+    "silent": SilentBackend
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_tts_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = TTS_BACKENDS[Config.TTS_BACKEND]()
+        return _backend
+
+
+def set_tts_backend(backend):
+    """
+    Replace the TTS engine. Any object with a `name` and a `synthesize(text, lang) -> bytes` method works.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# ------------------ HINDI TEXT ------------------ #
+
+def sentiment_distribution_phrases(sentiment_dist):
+    """
+    The Hindi sentiment distribution sentence as a list of reusable phrases and numbers.
     """
     pos = sentiment_dist.get("Positive", 0)
     neu = sentiment_dist.get("Neutral", 0)
     neg = sentiment_dist.get("Negative", 0)
 
-    hindi_text = (
-        f"कुल समाचार कवरेज में "
-        f"{pos} सकारात्मक, "
-        f"{neu} तटस्थ और "
-        f"{neg} नकारात्मक लेख शामिल हैं।"
-    )
-    return hindi_text
+    return [
+        "कुल समाचार कवरेज में",
+        str(pos), "सकारात्मक,",
+        str(neu), "तटस्थ और",
+        str(neg), "नकारात्मक लेख शामिल हैं।"
+    ]
+
+
+def sentiment_distribution_to_hindi(sentiment_dist):
+    """
+    Convert sentiment distribution dict to a proper Hindi sentence.
+    """
+    return " ".join(sentiment_distribution_phrases(sentiment_dist))
 
 
 def final_summary_to_hindi(final_text):
@@ -25,38 +106,124 @@ def final_summary_to_hindi(final_text):
     """
     text = final_text.lower()
 
-    if "mostly positive" in text:
-        return "समाचार कवरेज मुख्य रूप से सकारात्मक है, जो कंपनी की अच्छी प्रगति को दर्शाता है।"
-    elif "mostly critical" in text:
-        return "समाचार कवरेज मुख्य रूप से आलोचनात्मक है, जो प्रदर्शन की चिंताओं की ओर इशारा करता है।"
-    elif "largely neutral" in text:
-        return "समाचार कवरेज अधिकतर तटस्थ है, जो संतुलित और तथ्यात्मक रिपोर्टिंग को दर्शाता है।"
-    elif "mixed" in text:
-        return "समाचार कवरेज मिश्रित है, जिसमें विभिन्न दृष्टिकोण सामने आए हैं।"
-    else:
-        return "समाचार कवरेज में विविध विषय शामिल हैं।"
+    for marker, phrase in SUMMARY_PHRASES.items():
+        if marker in text:
+            return phrase
+    return DEFAULT_SUMMARY_PHRASE
+
 
+# ------------------ AUDIO ------------------ #
 
-def speak_hindi_sentiment_report(sentiment_dist, final_summary, filename="hindiaudio.mp3"):
+def _strip_id3(audio):
     """
-    Generate Hindi audio report and save to file using gTTS.
+    Drop ID3v2 headers and ID3v1 trailers so MP3 segments can be joined frame to frame.
     """
-    hindi_sentiment = sentiment_distribution_to_hindi(sentiment_dist)
-    hindi_summary = final_summary_to_hindi(final_summary)
+    if audio[:3] == b"ID3" and len(audio) >= 10:
+        size = (audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9]
+        footer = 10 if audio[5] & 0x10 else 0
+        audio = audio[10 + size + footer:]
+    if len(audio) >= 128 and audio[-128:-125] == b"TAG":
+        audio = audio[:-128]
+    return audio
 
-    full_text = hindi_sentiment + " " + hindi_summary
 
-    print(f"[INFO] Generating TTS: {full_text}")
+def synthesize_phrase(phrase, lang="hi"):
+    """
+    Audio for a single phrase, synthesized once per backend and then served from the cache.
+    """
+    backend = get_tts_backend()
+    key = content_hash(f"{lang}:{phrase}")
+    audio = cache.get("tts", backend.name, key)
+    if audio is None:
+        audio = _strip_id3(backend.synthesize(phrase, lang=lang))
+        cache.set("tts", backend.name, key, audio)
+    return audio
 
-    try:
-        tts = gTTS(text=full_text, lang='hi')
-        tts.save(filename)
-        print(f"[SUCCESS] Hindi sentiment report saved as: {filename}")
-    except Exception as e:
-        print(f"[ERROR] gTTS failed: {e}")
 
-    # Optional: auto-play on local machine
+def render_hindi_sentiment_report(sentiment_dist, final_summary):
+    """
+    Build the Hindi audio report in memory by joining pre-synthesized phrase segments.
+    MP3 frames are concatenated as-is, without re-encoding.
+    Returns: MP3 bytes
+    """
+    phrases = sentiment_distribution_phrases(sentiment_dist) + [final_summary_to_hindi(final_summary)]
+    return b"".join(synthesize_phrase(phrase) for phrase in phrases)
+
+
+def audio_report_id(sentiment_dist, final_summary):
+    """
+    Id of the audio report for a sentiment distribution and final summary, e.g. "3-1-0-mostly-positive".
+    The audio depends on nothing else, so it can be rebuilt from the id by any server process.
+    """
+    text = final_summary.lower()
+    tone = next((marker for marker in SUMMARY_PHRASES if marker in text), DEFAULT_TONE)
+    counts = [sentiment_dist.get(label, 0) for label in ("Positive", "Neutral", "Negative")]
+    return "-".join([*map(str, counts), tone.replace(" ", "-")])
+
+
+def parse_audio_report_id(audio_id):
+    """
+    Inverse of audio_report_id: (sentiment_dist, final_summary). Raises ValueError for an invalid id,
+    including one counting more articles than a report contains.
+    """
+    match = _AUDIO_ID.fullmatch(audio_id)
+    tone = match.group(4).replace("-", " ") if match else None
+    if tone not in SUMMARY_PHRASES and tone != DEFAULT_TONE:
+        raise ValueError(f"Invalid audio report id: {audio_id}")
+    positive, neutral, negative = (int(count) for count in match.group(1, 2, 3))
+    if positive + neutral + negative > Config.REPORT_ARTICLES:
+        raise ValueError(f"Invalid audio report id: {audio_id}")
+    return {"Positive": positive, "Neutral": neutral, "Negative": negative}, tone
+
+
+def audio_report_etag(audio_id):
+    """
+    Strong ETag for an audio report: its id and the TTS backend that voices it.
+    """
+    return f'"{content_hash(get_tts_backend().name + ":" + audio_id)}"'
+
+
+def render_audio_report(audio_id):
+    """
+    MP3 bytes of the audio report with this id. Raises ValueError for an invalid id.
+    """
+    sentiment_dist, final_summary = parse_audio_report_id(audio_id)
+    with span("tts"):
+        return render_hindi_sentiment_report(sentiment_dist, final_summary)
+
+
+def warm_phrase_cache(max_count=10):
+    """
+    Pre-synthesize every template phrase and the numbers 0..max_count.
+    """
+    phrases = sentiment_distribution_phrases({})[::2] + list(SUMMARY_PHRASES.values()) + [DEFAULT_SUMMARY_PHRASE]
+    phrases += [str(n) for n in range(max_count + 1)]
+    for phrase in phrases:
+        try:
+            synthesize_phrase(phrase)
+        except Exception as e:
+            logger.warning("Could not pre-synthesize TTS phrase: %s", e)
+            return
+
+
+def speak_hindi_sentiment_report(sentiment_dist, final_summary, filename=None):
+    """
+    Generate the Hindi audio report in memory, optionally also saving it to `filename`.
+    Returns: base64-encoded MP3, or None if synthesis failed
+    """
+    logger.info("Generating TTS: %s %s",
+                sentiment_distribution_to_hindi(sentiment_dist), final_summary_to_hindi(final_summary))
+
     try:
-        os.system(f"start {filename}" if os.name == "nt" else f"xdg-open {filename}")
+        with span("tts"):
+            audio = render_hindi_sentiment_report(sentiment_dist, final_summary)
     except Exception as e:
-        print(f"[WARN] Could not auto-play the audio file: {e}")
+        logger.error("TTS failed: %s", e)
+        return None
+
+    if filename:
+        with open(filename, "wb") as f:
+            f.write(audio)
+        logger.info("Hindi sentiment report saved as: %s", filename)
+
+    return base64.b64encode(audio).decode("ascii")
@@ -0,0 +1,381 @@
+import fcntl
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from scipy import sparse
+
+from utils import Config
+from utils.Dedup import canonicalize_url
+
+'''
+Persistent store of article summary embeddings for similar-coverage search across reports.
+  - vectors.f32: normalized float32 rows, append-only, read through a memory map
+  - lists.i32: the IVF list of each row (-1 before the index is trained)
+  - centroids.npy: IVF centroids, from spherical k-means over a sample of the rows
+  - meta.sqlite3: company, URL, title, date and sentiment of each row (row id = vector row)
+A query scores the centroids, then only the rows of the `nprobe` closest lists, so only those rows are
+read from disk. Small stores are searched exactly until they reach VECTOR_TRAIN_MIN rows; the index is
+retrained when the store has grown 4x since the last training.
+Several server processes can share a store: writers take an exclusive file lock, and every operation
+first picks up rows and indexes written by the other processes.
+'''
+
+logger = logging.getLogger(__name__)
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 100000
+CHUNK_ROWS = 65536  # rows read from the memory map at a time when streaming over the whole store
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _company_key(company):
+    return " ".join(company.lower().split())
+
+
+def _assign(vectors, centroids):
+    return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+
+def spherical_kmeans(sample, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    K-means on the unit sphere (cosine similarity): centroids are renormalized means of their members.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids)
+        members = sparse.csr_matrix(
+            (np.ones(len(sample), dtype=np.float32), (assignment, np.arange(len(sample)))),
+            shape=(n_lists, len(sample))
+        )
+        sums = np.asarray(members @ sample)
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        # Empty lists are re-seeded with random rows
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class VectorStore:
+    """
+    Append-only embedding store with an IVF index. Writes are serialized; searches read the memory map.
+    """
+
+    def __init__(self, directory=Config.VECTOR_STORE_DIR, enabled=Config.VECTOR_STORE_ENABLED,
+                 train_min=Config.VECTOR_TRAIN_MIN, nprobe=Config.VECTOR_NPROBE):
+        self.directory = directory
+        self.enabled = enabled
+        self.train_min = train_min
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._conn = None
+        self._dim = None
+        self._count = 0
+        self._vectors = None  # memmap over the first _mapped rows
+        self._mapped = 0
+        self._centroids = None
+        self._trained_count = 0
+        self._lists = None  # (sorted row ids, list offsets, rows covered) of the inverted lists
+        self._opened = False
+
+    # ------------------ STORAGE ------------------ #
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        """
+        Connect on first use (so forked server workers each get their own connection), then catch up
+        with other processes.
+        """
+        if not self._opened:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = sqlite3.connect(self._path("meta.sqlite3"), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "id INTEGER PRIMARY KEY, company TEXT NOT NULL, name TEXT NOT NULL, canonical_url TEXT NOT NULL, "
+                "url TEXT NOT NULL, "
+                "title TEXT, publish_date TEXT, sentiment TEXT, sentiment_score REAL, added REAL NOT NULL, "
+                "UNIQUE (company, canonical_url))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_url ON vectors(canonical_url)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+            self._opened = True
+        self._sync()
+
+    def _sync(self):
+        """
+        Catch up with rows appended and indexes trained by other processes. Only rows whose metadata
+        is committed count, so the files may hold more rows than this.
+        """
+        settings = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+        self._dim = int(settings["dim"]) if "dim" in settings else None
+        self._count = self._conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM vectors").fetchone()[0]
+        trained_count = int(settings.get("trained_count", 0))
+        if trained_count != self._trained_count or (trained_count and self._centroids is None):
+            self._centroids = np.load(self._path("centroids.npy"))
+            self._trained_count = trained_count
+            self._lists = None
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Cross-process write lock, held while appending or training.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path("write.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._open()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _map(self):
+        """
+        Memory map covering every stored row (remapped after appends).
+        """
+        if self._mapped != self._count:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r",
+                                      shape=(self._count, self._dim)) if self._count else None
+            self._mapped = self._count
+        return self._vectors
+
+    def _row_lists(self):
+        return np.memmap(self._path("lists.i32"), dtype=np.int32, mode="r", shape=(self._count,))
+
+    # ------------------ WRITES ------------------ #
+
+    def add(self, company, articles):
+        """
+        Append the summary embeddings of processed articles (with 'url', 'title' and 'embedding') for a
+        company. Articles already stored for the company are skipped. Returns the number of rows added.
+        """
+        if not self.enabled:
+            return 0
+        articles = [article for article in articles if article.get('embedding') is not None]
+        if not articles:
+            return 0
+
+        with self._lock, self._exclusive():
+            key = _company_key(company)
+            canonical = [canonicalize_url(article['url']) for article in articles]
+            known = {
+                row[0] for row in self._conn.execute(
+                    f"SELECT canonical_url FROM vectors WHERE company = ? "
+                    f"AND canonical_url IN ({', '.join('?' * len(canonical))})", (key, *canonical)
+                )
+            }
+            new, seen = [], set()
+            for article, url in zip(articles, canonical):
+                if url not in known and url not in seen:
+                    seen.add(url)
+                    new.append((article, url))
+            if not new:
+                return 0
+
+            vectors = _normalize(np.vstack([article['embedding'] for article, _ in new]))
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('dim', ?)", (str(self._dim),))
+            # Rows written by an add whose metadata never committed are dropped
+            for name, width in (("vectors.f32", 4 * self._dim), ("lists.i32", 4)):
+                if os.path.exists(self._path(name)) and os.path.getsize(self._path(name)) > self._count * width:
+                    os.truncate(self._path(name), self._count * width)
+            lists = (
+                _assign(vectors, self._centroids) if self._centroids is not None
+                else np.full(len(vectors), -1, dtype=np.int32)
+            )
+
+            # Vectors first, metadata last: a crash in between leaves rows that the next add truncates
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._path("lists.i32"), "ab") as f:
+                f.write(lists.tobytes())
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO vectors (id, company, name, canonical_url, url, title, publish_date, sentiment, "
+                "sentiment_score, added) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self._count + i, key, company.strip(), url, article['url'], article.get('title'),
+                     article.get('publish_date'), article.get('sentiment'), article.get('sentiment_score'), now)
+                    for i, (article, url) in enumerate(new)
+                ]
+            )
+            self._conn.commit()
+            self._count += len(new)
+
+            if self._count >= self.train_min and self._count >= 4 * self._trained_count:
+                self._train()
+            return len(new)
+
+    def train(self):
+        """
+        (Re)build the IVF index: k-means on a sample of the rows, then reassign every row to its list,
+        streaming the store through the memory map.
+        """
+        with self._lock, self._exclusive():
+            self._train()
+
+    def _train(self):
+        # The caller holds the write lock
+        vectors = self._map()
+        if vectors is None:
+            return
+        started = time.perf_counter()
+        n_lists = max(1, min(int(2 * math.sqrt(self._count)), self._count // 16))
+        rng = np.random.default_rng(self._count)
+        sample_rows = np.sort(rng.choice(self._count, min(self._count, KMEANS_SAMPLE, 64 * n_lists), replace=False))
+        centroids = spherical_kmeans(np.asarray(vectors[sample_rows]), n_lists)
+
+        lists = np.memmap(self._path("lists.i32"), dtype=np.int32, mode="r+", shape=(self._count,))
+        for start in range(0, self._count, CHUNK_ROWS):
+            lists[start:start + CHUNK_ROWS] = _assign(np.asarray(vectors[start:start + CHUNK_ROWS]), centroids)
+        lists.flush()
+        del lists
+
+        tmp_path = self._path("centroids.npy.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, centroids)
+        os.replace(tmp_path, self._path("centroids.npy"))
+        self._centroids = centroids
+        self._trained_count = self._count
+        self._lists = None
+        self._conn.execute(
+            "INSERT OR REPLACE INTO settings VALUES ('trained_count', ?)", (str(self._trained_count),)
+        )
+        self._conn.commit()
+        logger.info("Trained vector index: %d lists over %d vectors in %.1fs",
+                    n_lists, self._count, time.perf_counter() - started)
+
+    # ------------------ SEARCH ------------------ #
+
+    def _inverted_lists(self):
+        """
+        Row ids grouped by list (ids sorted by list, plus each list's offset). Rebuilt from lists.i32
+        when more than a tenth of the rows were appended since the last build; until then the newer
+        rows are checked directly.
+        """
+        if self._lists is None or self._count - self._lists[2] > self._count // 10:
+            lists = np.asarray(self._row_lists())
+            order = np.argsort(lists, kind="stable").astype(np.int64)
+            offsets = np.searchsorted(lists[order], np.arange(len(self._centroids) + 1))
+            self._lists = (order, offsets, self._count)
+        return self._lists
+
+    def _candidates(self, query, nprobe):
+        """
+        Row ids to score for a query: every row for an untrained store, else the rows of the closest lists.
+        """
+        if self._centroids is None:
+            return None
+        probed = np.argsort(-(self._centroids @ query))[:nprobe]
+        order, offsets, covered = self._inverted_lists()
+        ids = [order[offsets[p]:offsets[p + 1]] for p in probed]
+        if covered < self._count:
+            tail = np.asarray(self._row_lists()[covered:])
+            ids.append(covered + np.flatnonzero(np.isin(tail, probed)))
+        return np.sort(np.concatenate(ids))
+
+    def vector_for_url(self, url):
+        """
+        Stored embedding of an article URL (any company), or None.
+        """
+        with self._lock:
+            if not self.enabled:
+                return None
+            self._open()
+            row = self._conn.execute(
+                "SELECT id FROM vectors WHERE canonical_url = ? LIMIT 1", (canonicalize_url(url),)
+            ).fetchone()
+            if row is None:
+                return None
+            return np.array(self._map()[row[0]])
+
+    def search(self, query, k=10, company=None, exclude_url=None, nprobe=None):
+        """
+        The k stored articles most similar to a query embedding. With `company`, that company's rows are
+        scored exactly instead of going through the IVF lists. Copies of `exclude_url` are left out.
+        Returns: (list of article dicts with a 'similarity', number of vectors scored)
+        """
+        with self._lock:
+            if not self.enabled:
+                return [], 0
+            self._open()
+            vectors = self._map()
+            if vectors is None:
+                return [], 0
+            query = _normalize(query).reshape(-1)
+            if company:
+                candidates = np.array([
+                    row[0] for row in self._conn.execute(
+                        "SELECT id FROM vectors WHERE company = ? ORDER BY id", (_company_key(company),)
+                    )
+                ], dtype=np.int64)
+            else:
+                candidates = self._candidates(query, nprobe or self.nprobe)
+
+        if candidates is None:
+            scores = np.concatenate([
+                np.asarray(vectors[start:start + CHUNK_ROWS]) @ query for start in range(0, len(vectors), CHUNK_ROWS)
+            ])
+            ids = np.arange(len(scores))
+        else:
+            ids = candidates
+            scores = np.asarray(vectors[ids]) @ query if len(ids) else np.zeros(0, dtype=np.float32)
+
+        # A few extra in case copies of the excluded URL rank among the best
+        fetch = min(len(ids), k + (5 if exclude_url else 0))
+        top = np.argpartition(-scores, fetch - 1)[:fetch] if 0 < fetch < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        excluded = canonicalize_url(exclude_url) if exclude_url else None
+        with self._lock:
+            rows = {
+                row[0]: row for row in self._conn.execute(
+                    f"SELECT id, company, canonical_url, url, title, publish_date, sentiment, sentiment_score, name "
+                    f"FROM vectors WHERE id IN ({', '.join('?' * len(top))})", [int(ids[i]) for i in top]
+                )
+            } if len(top) else {}
+
+        results = []
+        for i in top:
+            row = rows.get(int(ids[i]))
+            if row is None or row[2] == excluded:
+                continue
+            results.append({
+                "company": row[8], "url": row[3], "title": row[4], "publish_date": row[5],
+                "sentiment": row[6], "sentiment_score": row[7], "similarity": round(float(scores[i]), 4)
+            })
+            if len(results) == k:
+                break
+        return results, len(ids)
+
+    def stats(self):
+        with self._lock:
+            if not self.enabled:
+                return {"enabled": False}
+            self._open()
+            return {
+                "enabled": True,
+                "vectors": self._count,
+                "dimension": self._dim,
+                "lists": 0 if self._centroids is None else len(self._centroids),
+                "trained_on": self._trained_count
+            }
+
+
+# Shared store used by the API server
+vector_store = VectorStore()